@@ -0,0 +1,226 @@
+##
+##
+
+import io
+import json
+import time
+import random
+import asyncio
+import hashlib
+import logging
+import datetime
+import threading
+from typing import List, Optional, Tuple, Union
+import numpy as np
+from aiohttp import web
+from PIL import Image as PILImage
+from couchbase.exceptions import DocumentNotFoundException
+from moviedemo.google_embedding import EmbeddingClient
+
+logger = logging.getLogger('benchmarks.fakes')
+logger.addHandler(logging.NullHandler())
+
+
+def poster_bytes(size: int = 256) -> bytes:
+    image = PILImage.new('RGB', (size, size * 3 // 2))
+    pixels = np.random.default_rng(0).integers(0, 256, (size * 3 // 2, size, 3), dtype=np.uint8)
+    image.paste(PILImage.fromarray(pixels))
+    buffer = io.BytesIO()
+    image.save(buffer, format='JPEG', quality=85)
+    return buffer.getvalue()
+
+
+class FakeTMDB(object):
+
+    def __init__(self,
+                 movies_per_month: int = 40,
+                 page_size: int = 20,
+                 latency: float = 0.005,
+                 throttle_rate: float = 0.0,
+                 image_size: int = 256,
+                 seed: int = 0):
+        self.movies_per_month = movies_per_month
+        self.page_size = page_size
+        self.latency = latency
+        self.throttle_rate = throttle_rate
+        self.poster = poster_bytes(image_size)
+        self.requests = 0
+        self.throttled = 0
+        self.port = None
+        self._random = random.Random(seed)
+        self._loop = None
+        self._runner = None
+        self._thread = None
+        self._ready = threading.Event()
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.port}"
+
+    @property
+    def image_prefix(self) -> str:
+        return f"{self.url}/t/p/original"
+
+    @staticmethod
+    def movie_id(year: int, month: int, n: int) -> int:
+        return (year * 100 + month) * 100000 + n
+
+    async def delay(self) -> Optional[web.Response]:
+        self.requests += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        if self.throttle_rate and self._random.random() < self.throttle_rate:
+            self.throttled += 1
+            return web.Response(status=429, headers={'Retry-After': '0'})
+        return None
+
+    async def discover(self, request: web.Request) -> web.Response:
+        throttled = await self.delay()
+        if throttled:
+            return throttled
+        year = int(request.query['primary_release_year'])
+        month = int(request.query['primary_release_date.gte'].split('-')[1])
+        page = int(request.query.get('page', 1))
+        total_pages = max(1, -(-self.movies_per_month // self.page_size))
+        first = (page - 1) * self.page_size
+        last = min(first + self.page_size, self.movies_per_month)
+        results = [dict(id=self.movie_id(year, month, n)) for n in range(first, last)]
+        return web.json_response(dict(page=page, total_pages=total_pages, total_results=self.movies_per_month, results=results))
+
+    async def detail(self, request: web.Request) -> web.Response:
+        throttled = await self.delay()
+        if throttled:
+            return throttled
+        movie_id = int(request.match_info['movie_id'])
+        year, month = divmod(movie_id // 100000, 100)
+        release = datetime.date(year, month, 1 + movie_id % 28)
+        return web.json_response(dict(
+            id=movie_id,
+            title=f"Benchmark Movie {movie_id}",
+            release_date=release.isoformat(),
+            popularity=round(self._random.random() * 100, 3),
+            imdb_id=f"tt{movie_id}",
+            overview=f"A generated movie number {movie_id % 100000} released in {release.strftime('%B %Y')}.",
+            poster_path=f"/{movie_id}.jpg",
+            backdrop_path=f"/{movie_id}-backdrop.jpg"
+        ))
+
+    async def image(self, request: web.Request) -> web.Response:
+        throttled = await self.delay()
+        if throttled:
+            return throttled
+        return web.Response(body=self.poster, content_type='image/jpeg', headers={'ETag': '"poster"'})
+
+    def app(self) -> web.Application:
+        app = web.Application()
+        app.router.add_get('/3/discover/movie', self.discover)
+        app.router.add_get('/3/movie/{movie_id}', self.detail)
+        app.router.add_get('/t/p/original/{name}', self.image)
+        return app
+
+    def _serve(self):
+        self._loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self._loop)
+        self._runner = web.AppRunner(self.app(), access_log=None)
+        self._loop.run_until_complete(self._runner.setup())
+        site = web.TCPSite(self._runner, '127.0.0.1', 0)
+        self._loop.run_until_complete(site.start())
+        self.port = site._server.sockets[0].getsockname()[1]
+        self._ready.set()
+        self._loop.run_forever()
+        self._loop.run_until_complete(self._runner.cleanup())
+        self._loop.close()
+
+    def start(self):
+        self._thread = threading.Thread(target=self._serve, name='fake-tmdb', daemon=True)
+        self._thread.start()
+        self._ready.wait()
+        logger.debug(f"fake TMDB listening on {self.url}")
+        return self
+
+    def stop(self):
+        if self._loop:
+            self._loop.call_soon_threadsafe(self._loop.stop)
+            self._thread.join()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.stop()
+
+
+class FakeEmbeddingClient(EmbeddingClient):
+
+    def __init__(self, delay: float = 0.05, jitter: float = 0.0):
+        super().__init__()
+        self.delay = delay
+        self.jitter = jitter
+        self.calls = 0
+        self._count_lock = threading.Lock()
+
+    @classmethod
+    def install(cls, *args, **kwargs):
+        with EmbeddingClient._instance_lock:
+            EmbeddingClient._instance = cls(*args, **kwargs)
+            return EmbeddingClient._instance
+
+    def initialize(self):
+        pass
+
+    @staticmethod
+    def vector(seed: bytes, dimension: int) -> List[float]:
+        rng = np.random.default_rng(int.from_bytes(hashlib.sha256(seed).digest()[:8], 'little'))
+        return rng.standard_normal(dimension, dtype=np.float32).tolist()
+
+    def wait(self):
+        with self._count_lock:
+            self.calls += 1
+        time.sleep(self.delay + (random.random() * self.jitter if self.jitter else 0.0))
+
+    def get_image_embeddings(self, image_bytes: bytes, contextual_text: Optional[str] = None, dimension: int = 1408) -> Tuple[Optional[List[float]], Optional[List[float]]]:
+        self.wait()
+        text = contextual_text.encode('utf-8') if contextual_text is not None else b''
+        text_embedding = self.vector(text, dimension) if contextual_text is not None else None
+        return self.vector(image_bytes + text, dimension), text_embedding
+
+    def get_text_embeddings(self, contextual_text: str, dimension: int = 1408) -> List[float]:
+        self.wait()
+        return self.vector(contextual_text.encode('utf-8'), dimension)
+
+
+class MemoryCollection(object):
+
+    def __init__(self):
+        self.documents = {}
+        self._lock = threading.Lock()
+
+    def remove(self, key: str):
+        with self._lock:
+            if self.documents.pop(key, None) is None:
+                raise DocumentNotFoundException(message=f"document {key} not found")
+
+
+class MemoryOperation(object):
+
+    def __init__(self, latency: float = 0.0):
+        self.latency = latency
+        self.collection = MemoryCollection()
+        self.bytes_written = 0
+
+    def put_doc(self, collection: MemoryCollection, key: str, document: dict):
+        data = json.dumps(document)
+        if self.latency:
+            time.sleep(self.latency)
+        with collection._lock:
+            collection.documents[key] = data
+            self.bytes_written += len(data)
+
+    def get_doc(self, collection: MemoryCollection, key: str) -> dict:
+        data = collection.documents.get(key)
+        if data is None:
+            raise DocumentNotFoundException(message=f"document {key} not found")
+        return json.loads(data)
+
+    def documents(self, exclude: Union[str, None] = None) -> List[dict]:
+        return [dict(json.loads(data), id=key) for key, data in self.collection.documents.items() if key != exclude]
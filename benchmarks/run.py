@@ -0,0 +1,211 @@
+#!/usr/bin/env python3
+##
+##
+
+import os
+import time
+import random
+import argparse
+import tempfile
+import threading
+import concurrent.futures
+from typing import List
+import requests
+from waitress.server import create_server
+from moviedemo.restmgr import RESTManager
+from moviedemo.generate_source_data import YearWriter, parse_years
+from moviedemo.datafile import DataFile, DataWriter
+from moviedemo.pipeline import Pipeline
+from moviedemo.image_cache import ImageCache
+from moviedemo.embedding_store import EmbeddingStore
+from moviedemo.checkpoint import Checkpoint
+from moviedemo.storage_profile import StorageProfile, DIMENSIONS
+from moviedemo.search import LocalSearch
+from moviedemo.cache import QueryEmbeddingCache, ResultCache
+from moviedemo.coalescer import EmbeddingCoalescer
+from benchmarks.fakes import FakeTMDB, FakeEmbeddingClient, MemoryOperation
+from benchmarks.stats import LatencyRecorder, Report
+
+
+def bench_generate(options, tmdb: FakeTMDB, report: Report) -> List[str]:
+    years = parse_years(options.years)
+    rest = RESTManager(hostname='127.0.0.1',
+                       port=tmdb.port,
+                       use_ssl=False,
+                       max_in_flight=options.in_flight,
+                       requests_per_second=options.rate,
+                       image_prefix=tmdb.image_prefix)
+    writer = YearWriter(years, 'jsonl')
+    requests_before = tmdb.requests
+    throttled_before = tmdb.throttled
+
+    start_time = time.perf_counter()
+    try:
+        rest.get_tmdb_years(years, writer.add, options.months)
+    finally:
+        writer.close()
+    run_duration = time.perf_counter() - start_time
+    rest.close()
+
+    report.add('generate', writer.record_count, run_duration,
+               requests=tmdb.requests - requests_before,
+               throttled=tmdb.throttled - throttled_before)
+    return [writer.output_file(year) for year in years]
+
+
+def bench_load(options, files: List[str], op: MemoryOperation, report: Report, name: str = 'load'):
+    from moviedemo.data_load import MovieLoader
+
+    class TimedLoader(MovieLoader):
+
+        def __init__(self, *args, **kwargs):
+            super().__init__(*args, **kwargs)
+            self.latency = LatencyRecorder()
+            self.started = {}
+
+        def write(self, item: dict):
+            result = super().write(item)
+            self.latency.record(time.perf_counter() - self.started.pop(item['movie']['id']))
+            return result
+
+    cache = ImageCache.configure(os.path.join(options.work_dir, 'images'))
+    EmbeddingStore.configure(os.path.join(options.work_dir, 'embeddings'))
+    checkpoint = Checkpoint(os.path.join(options.work_dir, 'bench.checkpoint'), reset=True)
+    loader = TimedLoader(op, cache, checkpoint, profile=StorageProfile(options.dimension))
+    client = FakeEmbeddingClient.install(options.embed_delay / 1000.0)
+    bytes_before = op.bytes_written
+
+    def source():
+        for file_name in files:
+            for movie in DataFile(file_name):
+                loader.started[movie['id']] = time.perf_counter()
+                yield movie
+
+    pipeline = Pipeline(loader.stages(options.workers), queue_size=options.workers * 4)
+
+    start_time = time.perf_counter()
+    pipeline.run(source())
+    run_duration = time.perf_counter() - start_time
+    checkpoint.close()
+
+    report.add(name, len(loader.latency), run_duration, loader.latency,
+               errors=pipeline.errors,
+               embedding_calls=client.calls,
+               image_hits=cache.hits,
+               bytes_written=op.bytes_written - bytes_before)
+
+
+def bench_query(options, op: MemoryOperation, report: Report):
+    import moviedemo.demo_server as demo_server
+
+    document_file = os.path.join(options.work_dir, 'documents.jsonl')
+    with DataWriter(document_file, 'jsonl') as writer:
+        writer.write(op.documents())
+    backend = LocalSearch.from_file(document_file, vector_fields=('image_embedding',))
+    if options.result_cache_size > 0:
+        backend = ResultCache(backend, options.result_cache_size)
+    demo_server.backend = backend
+    demo_server.dimension = options.dimension
+
+    client = FakeEmbeddingClient.install(options.embed_delay / 1000.0)
+    coalescer = EmbeddingCoalescer(options.batch_wait / 1000.0, options.batch_size, options.embed_concurrency)
+    query_cache = QueryEmbeddingCache.configure(options.query_cache_size, None, None, coalescer.embed)
+
+    server = create_server(demo_server.app, host='127.0.0.1', port=0, threads=options.threads)
+    server_thread = threading.Thread(target=server.run, name='waitress', daemon=True)
+    server_thread.start()
+    url = f"http://127.0.0.1:{server.effective_port}/api/search"
+
+    questions = [f"a movie about topic number {n}" for n in range(options.questions)]
+    latency = LatencyRecorder()
+    errors = []
+    sessions = []
+    local = threading.local()
+
+    def query(n: int):
+        if not hasattr(local, 'session'):
+            local.session = requests.Session()
+            sessions.append(local.session)
+        question = random.Random(n).choice(questions)
+        begin = time.perf_counter()
+        response = local.session.post(url, json=dict(question=question, k=options.k))
+        latency.record(time.perf_counter() - begin)
+        if response.status_code != 200:
+            errors.append(response.status_code)
+
+    start_time = time.perf_counter()
+    with concurrent.futures.ThreadPoolExecutor(max_workers=options.clients) as executor:
+        list(executor.map(query, range(options.queries)))
+    run_duration = time.perf_counter() - start_time
+
+    for session in sessions:
+        session.close()
+    server.trigger.pull_trigger(server.close)
+    server_thread.join(5.0)
+    server.task_dispatcher.shutdown()
+    coalescer.close()
+
+    report.add('query', len(latency), run_duration, latency,
+               errors=len(errors),
+               embedding_calls=client.calls,
+               query_cache_hits=query_cache.hits,
+               batches=coalescer.batches)
+
+
+def main():
+    parser = argparse.ArgumentParser(add_help=False)
+    parser.add_argument('-b', '--bench', action='store', help="Benchmarks to Run", choices=['generate', 'load', 'query', 'all'], default='all')
+    parser.add_argument('-Y', '--years', action='store', help="Years to Generate", default="2023")
+    parser.add_argument('-m', '--movies', action='store', help="Movies per Month", type=int, default=40)
+    parser.add_argument('-l', '--latency', action='store', help="Fake TMDB Latency (ms)", type=float, default=5)
+    parser.add_argument('-T', '--throttle', action='store', help="Fake TMDB 429 Rate (0-1)", type=float, default=0.0)
+    parser.add_argument('-i', '--in-flight', action='store', help="Maximum Concurrent TMDB Requests", type=int, default=40)
+    parser.add_argument('-M', '--months', action='store', help="Months Fetched Concurrently", type=int, default=3)
+    parser.add_argument('-r', '--rate', action='store', help="TMDB Requests per Second", type=float, default=1000.0)
+    parser.add_argument('-e', '--embed-delay', action='store', help="Fake Embedding Delay (ms)", type=float, default=50)
+    parser.add_argument('-W', '--write-latency', action='store', help="Fake Database Write Latency (ms)", type=float, default=1)
+    parser.add_argument('-w', '--workers', action='store', help="Loader Workers per Stage", type=int, default=4)
+    parser.add_argument('--dimension', action='store', help="Embedding Dimension", type=int, choices=DIMENSIONS, default=1408)
+    parser.add_argument('-q', '--queries', action='store', help="Search Requests", type=int, default=500)
+    parser.add_argument('-Q', '--questions', action='store', help="Distinct Questions", type=int, default=100)
+    parser.add_argument('-c', '--clients', action='store', help="Concurrent Search Clients", type=int, default=16)
+    parser.add_argument('-t', '--threads', action='store', help="Server Worker Threads", type=int, default=16)
+    parser.add_argument('-k', action='store', help="Results per Search", type=int, default=10)
+    parser.add_argument('--batch-wait', action='store', help="Query Embedding Batch Window (ms)", type=float, default=10)
+    parser.add_argument('--batch-size', action='store', help="Maximum Query Embedding Batch Size", type=int, default=16)
+    parser.add_argument('--embed-concurrency', action='store', help="Concurrent Query Embedding Calls", type=int, default=8)
+    parser.add_argument('--query-cache-size', action='store', help="Cached Query Embeddings (0 to Disable)", type=int, default=1024)
+    parser.add_argument('--result-cache-size', action='store', help="Cached Search Results (0 to Disable)", type=int, default=256)
+    parser.add_argument('-d', '--work-dir', action='store', help="Working Directory")
+    parser.add_argument('-o', '--output', action='store', help="Write Results to a JSON File")
+    parser.add_argument('-?', action='help')
+    options = parser.parse_args()
+
+    output = os.path.abspath(options.output) if options.output else None
+    options.work_dir = os.path.abspath(options.work_dir) if options.work_dir else tempfile.mkdtemp(prefix='moviedemo-bench-')
+    os.makedirs(options.work_dir, exist_ok=True)
+    os.chdir(options.work_dir)
+    print(f"Working directory {options.work_dir}")
+
+    report = Report()
+    op = MemoryOperation(options.write_latency / 1000.0)
+    with FakeTMDB(options.movies, latency=options.latency / 1000.0, throttle_rate=options.throttle) as tmdb:
+        report.begin()
+        files = bench_generate(options, tmdb, report)
+        if options.bench in ('load', 'query', 'all'):
+            report.begin()
+            bench_load(options, files, op, report)
+            if options.bench == 'all':
+                report.begin()
+                bench_load(options, files, op, report, 'load-warm')
+        if options.bench in ('query', 'all'):
+            report.begin()
+            bench_query(options, op, report)
+
+    report.print()
+    if output:
+        report.save(output)
+
+
+if __name__ == '__main__':
+    main()
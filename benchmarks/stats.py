@@ -0,0 +1,91 @@
+##
+##
+
+import sys
+import json
+import resource
+import threading
+from typing import List, Union
+import numpy as np
+
+
+def reset_peak_rss() -> bool:
+    try:
+        with open('/proc/self/clear_refs', 'w') as clear_refs:
+            clear_refs.write('5')
+        return True
+    except OSError:
+        return False
+
+
+def peak_rss_mb() -> float:
+    try:
+        with open('/proc/self/status') as status:
+            for line in status:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if sys.platform == 'darwin':
+        return peak / (1024 * 1024)
+    return peak / 1024
+
+
+class LatencyRecorder(object):
+
+    def __init__(self):
+        self.samples: List[float] = []
+        self._lock = threading.Lock()
+
+    def record(self, seconds: float):
+        with self._lock:
+            self.samples.append(seconds)
+
+    def __len__(self) -> int:
+        return len(self.samples)
+
+    def summary(self) -> dict:
+        if not self.samples:
+            return dict(p50_ms=None, p95_ms=None, p99_ms=None, max_ms=None)
+        values = np.asarray(self.samples) * 1000.0
+        p50, p95, p99 = np.percentile(values, [50, 95, 99])
+        return dict(p50_ms=round(float(p50), 2), p95_ms=round(float(p95), 2), p99_ms=round(float(p99), 2), max_ms=round(float(values.max()), 2))
+
+
+class Report(object):
+    COLUMNS = ('bench', 'records', 'seconds', 'records_per_sec', 'p50_ms', 'p95_ms', 'p99_ms', 'peak_rss_mb')
+
+    def __init__(self):
+        self.results: List[dict] = []
+        self.peak_reset = False
+
+    def begin(self):
+        self.peak_reset = reset_peak_rss()
+
+    def add(self, bench: str, records: int, seconds: float, latency: Union[LatencyRecorder, None] = None, **extra) -> dict:
+        result = dict(bench=bench,
+                      records=records,
+                      seconds=round(seconds, 3),
+                      records_per_sec=round(records / seconds, 1) if seconds > 0 else 0.0)
+        result.update(latency.summary() if latency else LatencyRecorder().summary())
+        result['peak_rss_mb'] = round(peak_rss_mb(), 1)
+        if not self.peak_reset:
+            result['peak_rss_scope'] = 'process'
+        self.peak_reset = False
+        result.update(extra)
+        self.results.append(result)
+        return result
+
+    def print(self):
+        print(' '.join(f"{column:>16}" for column in self.COLUMNS))
+        for result in self.results:
+            print(' '.join(f"{'-' if result.get(column) is None else result.get(column):>16}" for column in self.COLUMNS))
+        for result in self.results:
+            extra = {key: value for key, value in result.items() if key not in self.COLUMNS and key != 'max_ms'}
+            if extra:
+                print(f"{result['bench']}: {', '.join(f'{key}={value}' for key, value in extra.items())}")
+
+    def save(self, file_name: str):
+        with open(file_name, 'w') as output:
+            json.dump(self.results, output, indent=2)
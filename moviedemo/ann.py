@@ -0,0 +1,129 @@
+##
+##
+
+import os
+import json
+import math
+import logging
+from typing import Tuple, Union, Callable
+import numpy as np
+
+logger = logging.getLogger('moviedemo.ann')
+logger.addHandler(logging.NullHandler())
+
+
+class IVFIndex(object):
+
+    def __init__(self, centroids: np.ndarray, offsets: np.ndarray, order: np.ndarray, vectors: np.ndarray, nprobe: int = 8):
+        self.centroids = centroids
+        self.offsets = offsets
+        self.order = order
+        self.vectors = vectors
+        self.nprobe = nprobe
+        self.metadata = {}
+
+    @property
+    def nlist(self) -> int:
+        return len(self.centroids)
+
+    def __len__(self) -> int:
+        return len(self.order)
+
+    @staticmethod
+    def assign(vectors: np.ndarray, centroids: np.ndarray, batch_size: int = 8192) -> np.ndarray:
+        labels = np.empty(len(vectors), dtype=np.int32)
+        for start in range(0, len(vectors), batch_size):
+            labels[start:start + batch_size] = np.argmax(vectors[start:start + batch_size] @ centroids.T, axis=1)
+        return labels
+
+    @classmethod
+    def build(cls, vectors: np.ndarray, nlist: Union[int, None] = None, nprobe: int = 8, iterations: int = 10, sample_size: int = 65536, seed: int = 0):
+        vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+        count = len(vectors)
+        if count == 0:
+            raise ValueError("can not build an index without vectors")
+        if not nlist:
+            nlist = max(1, int(4 * math.sqrt(count)))
+        nlist = min(nlist, count)
+
+        rng = np.random.default_rng(seed)
+        sample = vectors[rng.choice(count, min(count, max(sample_size, nlist)), replace=False)]
+        centroids = sample[rng.choice(len(sample), nlist, replace=False)].copy()
+
+        for _ in range(iterations):
+            labels = cls.assign(sample, centroids)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, labels, sample)
+            sizes = np.bincount(labels, minlength=nlist)
+            empty = sizes == 0
+            if empty.any():
+                sums[empty] = sample[rng.choice(len(sample), int(empty.sum()), replace=False)]
+            norms = np.linalg.norm(sums, axis=1, keepdims=True)
+            norms[norms == 0] = 1.0
+            centroids = (sums / norms).astype(np.float32)
+
+        labels = cls.assign(vectors, centroids)
+        order = np.argsort(labels, kind='stable').astype(np.int64)
+        offsets = np.zeros(nlist + 1, dtype=np.int64)
+        offsets[1:] = np.cumsum(np.bincount(labels, minlength=nlist))
+        logger.debug(f"built IVF index with {nlist} lists over {count} vectors")
+        return cls(centroids, offsets, order, np.ascontiguousarray(vectors[order]), nprobe)
+
+    def search(self, query: np.ndarray, k: int, nprobe: Union[int, None] = None) -> Tuple[np.ndarray, np.ndarray]:
+        nprobe = min(nprobe or self.nprobe, self.nlist)
+        centroid_scores = self.centroids @ query
+        if nprobe < self.nlist:
+            probe = np.argpartition(-centroid_scores, nprobe - 1)[:nprobe]
+        else:
+            probe = np.arange(self.nlist)
+
+        positions = np.concatenate([np.arange(self.offsets[n], self.offsets[n + 1]) for n in probe])
+        if len(positions) == 0:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+        scores = self.vectors[positions] @ query
+        k = min(k, len(scores))
+        if k < len(scores):
+            best = np.argpartition(-scores, k - 1)[:k]
+        else:
+            best = np.arange(len(scores))
+        best = best[np.argsort(-scores[best])]
+        return self.order[positions[best]], scores[best]
+
+    def save(self, directory: str, **metadata):
+        os.makedirs(directory, exist_ok=True)
+        np.save(os.path.join(directory, 'centroids.npy'), self.centroids)
+        np.save(os.path.join(directory, 'offsets.npy'), self.offsets)
+        np.save(os.path.join(directory, 'order.npy'), self.order)
+        np.save(os.path.join(directory, 'vectors.npy'), self.vectors)
+        with open(os.path.join(directory, 'index.json'), 'w') as meta_file:
+            json.dump(dict(metadata, nlist=self.nlist, nprobe=self.nprobe, count=len(self), dimension=int(self.vectors.shape[1])), meta_file)
+
+    @classmethod
+    def load(cls, directory: str, mmap: bool = True):
+        mode = 'r' if mmap else None
+        with open(os.path.join(directory, 'index.json'), 'r') as meta_file:
+            metadata = json.load(meta_file)
+        index = cls(np.load(os.path.join(directory, 'centroids.npy')),
+                    np.load(os.path.join(directory, 'offsets.npy')),
+                    np.load(os.path.join(directory, 'order.npy'), mmap_mode=mode),
+                    np.load(os.path.join(directory, 'vectors.npy'), mmap_mode=mode),
+                    metadata.get('nprobe', 8))
+        index.metadata = metadata
+        return index
+
+
+def perturbed_queries(vectors: np.ndarray, count: int, noise: float = 0.5, seed: int = 0) -> np.ndarray:
+    rng = np.random.default_rng(seed)
+    rows = vectors[rng.choice(len(vectors), min(count, len(vectors)), replace=False)]
+    queries = rows + rng.standard_normal(rows.shape).astype(np.float32) * (noise / np.sqrt(rows.shape[1]))
+    return queries / np.linalg.norm(queries, axis=1, keepdims=True)
+
+
+def recall_at_k(exact: Callable[[np.ndarray, int], np.ndarray], approximate: Callable[[np.ndarray, int], np.ndarray], queries: np.ndarray, k: int = 10) -> float:
+    found = 0
+    total = 0
+    for query in queries:
+        expected = set(int(n) for n in exact(query, k))
+        found += len(expected & set(int(n) for n in approximate(query, k)))
+        total += len(expected)
+    return found / total if total else 1.0
@@ -0,0 +1,47 @@
+#!/usr/bin/env python3
+
+import os
+import time
+import argparse
+from moviedemo.search import LocalSearch
+from moviedemo.ann import recall_at_k, perturbed_queries
+
+
+def main():
+    parser = argparse.ArgumentParser(add_help=False)
+    parser.add_argument('-L', '--local', action='store', help="Exported Document File", required=True)
+    parser.add_argument('-o', '--output', action='store', help="Index Directory", default="movie-index")
+    parser.add_argument('-f', '--field', action='store', help="Vector Field", default="image_embedding")
+    parser.add_argument('-n', '--nlist', action='store', help="Number of Inverted Lists", type=int)
+    parser.add_argument('-p', '--nprobe', action='store', help="Lists Probed per Query", type=int, default=8)
+    parser.add_argument('-k', action='store', help="Recall Check Result Count", type=int, default=10)
+    parser.add_argument('-q', '--queries', action='store', help="Recall Check Query Count", type=int, default=100)
+    parser.add_argument('-?', action='help')
+    options = parser.parse_args()
+
+    backend = LocalSearch.from_file(options.local, vector_fields=(options.field,))
+
+    start_time = time.perf_counter()
+    index = backend.build_index(options.field, options.nlist, options.nprobe)
+    build_time = time.perf_counter() - start_time
+    index.save(options.output, field=options.field, source=os.path.abspath(options.local))
+    print(f"Built index with {index.nlist} lists over {len(index)} vectors in {build_time:.2f} seconds")
+
+    queries = perturbed_queries(backend.vectors[options.field], options.queries)
+
+    def exact(query, k):
+        return backend.exact_top_k(query, options.field, k)[0]
+
+    def approximate(query, k):
+        return index.search(query, k)[0]
+
+    for nprobe in sorted({1, options.nprobe // 2 or 1, options.nprobe, options.nprobe * 2, index.nlist}):
+        index.nprobe = min(nprobe, index.nlist)
+        start_time = time.perf_counter()
+        recall = recall_at_k(exact, approximate, queries, options.k)
+        latency = (time.perf_counter() - start_time) / len(queries) * 1000
+        print(f"nprobe {index.nprobe:5d}: recall@{options.k} {recall:.3f} at {latency:.3f} ms/query")
+
+
+if __name__ == '__main__':
+    main()
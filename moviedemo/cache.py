@@ -0,0 +1,176 @@
+##
+##
+
+import re
+import time
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Hashable, List, Union, Sequence
+import numpy as np
+from moviedemo.embedding_store import EmbeddingStore
+from moviedemo.google_embedding import EmbeddingClient, EMBEDDING_MODEL
+from moviedemo.search import SearchBackend
+
+logger = logging.getLogger('moviedemo.cache')
+logger.addHandler(logging.NullHandler())
+
+
+class LRUCache(object):
+
+    def __init__(self, max_size: int = 1024, ttl: Union[float, None] = None):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable) -> Any:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                value, expires = entry
+                if expires is None or expires > time.monotonic():
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._entries[key]
+            self.misses += 1
+            return None
+
+    def put(self, key: Hashable, value: Any):
+        if self.max_size <= 0:
+            return
+        expires = time.monotonic() + self.ttl if self.ttl else None
+        with self._lock:
+            self._entries[key] = (value, expires)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def remove(self, key: Hashable):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    @property
+    def hit_ratio(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+class QueryEmbeddingCache(object):
+    _instance = None
+    _instance_lock = threading.Lock()
+
+    def __init__(self,
+                 max_size: int = 1024,
+                 ttl: Union[float, None] = None,
+                 store: Union[EmbeddingStore, None] = None,
+                 embed: Union[Callable[[str, int], List[float]], None] = None):
+        self.memory = LRUCache(max_size, ttl)
+        self.store = store
+        self.embed = embed if embed else lambda text, dimension: EmbeddingClient.instance().get_text_embeddings(text, dimension)
+        self.store_hits = 0
+
+    @classmethod
+    def configure(cls, *args, **kwargs):
+        with cls._instance_lock:
+            cls._instance = cls(*args, **kwargs)
+            return cls._instance
+
+    @classmethod
+    def instance(cls):
+        with cls._instance_lock:
+            if cls._instance is None:
+                cls._instance = cls()
+            return cls._instance
+
+    @staticmethod
+    def normalize(text: str) -> str:
+        return re.sub(r'\s+', ' ', text).strip().lower()
+
+    @property
+    def hits(self) -> int:
+        return self.memory.hits
+
+    @property
+    def misses(self) -> int:
+        return self.memory.misses - self.store_hits
+
+    def get_text_embeddings(self, question: str, dimension: int = 1408) -> List[float]:
+        text = self.normalize(question)
+        key = (text, dimension)
+        vector = self.memory.get(key)
+        if vector is not None:
+            return vector
+
+        store_key = EmbeddingStore.make_key(EMBEDDING_MODEL, dimension, None, text) if self.store is not None else None
+        if store_key:
+            cached = self.store.get(store_key)
+            if cached and cached[1]:
+                self.store_hits += 1
+                self.memory.put(key, cached[1])
+                return cached[1]
+
+        vector = self.embed(text, dimension)
+        self.memory.put(key, vector)
+        if store_key:
+            self.store.put(store_key, None, vector)
+        logger.debug(f"embedded query \"{text}\" (hits {self.hits}, misses {self.misses})")
+        return vector
+
+
+class ResultCache(SearchBackend):
+
+    def __init__(self, backend: SearchBackend, max_size: int = 256, ttl: Union[float, None] = 300, check_interval: float = 5.0):
+        self.backend = backend
+        self.results = LRUCache(max_size, ttl)
+        self.check_interval = check_interval
+        self.invalidations = 0
+        self._generation = None
+        self._checked = 0.0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def make_key(vector: List[float], field: str, k: int, fields: Union[Sequence[str], None]) -> tuple:
+        digest = hashlib.sha256(np.asarray(vector, dtype=np.float32).tobytes()).hexdigest()
+        return digest, field, k, tuple(fields) if fields else None
+
+    def check_generation(self):
+        now = time.monotonic()
+        if now - self._checked < self.check_interval:
+            return
+        with self._lock:
+            if now - self._checked < self.check_interval:
+                return
+            self._checked = now
+            generation = self.backend.generation()
+            if self._generation is not None and generation != self._generation:
+                logger.debug(f"data generation changed from {self._generation} to {generation}, clearing result cache")
+                self.results.clear()
+                self.invalidations += 1
+            self._generation = generation
+
+    def generation(self) -> int:
+        return self.backend.generation()
+
+    def has_field(self, field: str) -> bool:
+        return self.backend.has_field(field)
+
+    def search(self, vector: List[float], field: str = 'image_embedding', k: int = 2, fields: Union[Sequence[str], None] = None) -> List[dict]:
+        self.check_generation()
+        key = self.make_key(vector, field, k, fields)
+        results = self.results.get(key)
+        if results is None:
+            results = self.backend.search(vector, field, k, fields)
+            self.results.put(key, results)
+        return list(results)
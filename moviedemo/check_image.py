@@ -1,7 +1,7 @@
 ##
 ##
 
-from moviedemo.restmgr import RESTManager
+from moviedemo.image_cache import ImageCache
 from PIL import Image
 from typing import Union
 import io
@@ -9,6 +9,7 @@ import PIL
 
 
 class CheckImage:
+    SUPPORTED_FORMATS = ("BMP", "GIF", "JPEG", "PNG")
 
     def __init__(self):
         pass
@@ -22,5 +23,5 @@ class CheckImage:
             return None
 
     def check_image_url(self, image_url: str) -> Union[str, None]:
-        image_bytes = RESTManager().get_url_content(image_url)
+        image_bytes = ImageCache.instance().get(image_url)
         return self.check_image_bytes(image_bytes)
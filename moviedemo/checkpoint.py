@@ -0,0 +1,80 @@
+##
+##
+
+import os
+import json
+import time
+import logging
+import threading
+from typing import Union
+
+logger = logging.getLogger('moviedemo.checkpoint')
+logger.addHandler(logging.NullHandler())
+
+
+class Checkpoint(object):
+
+    def __init__(self, file_name: str, reset: bool = False):
+        self.file_name = file_name
+        self.completed = set()
+        self.failed = {}
+        self._lock = threading.Lock()
+
+        if reset and os.path.exists(self.file_name):
+            os.unlink(self.file_name)
+        self.read()
+        self._journal = open(self.file_name, 'a')
+        if self._journal.tell() > 0 and not self._ends_with_newline():
+            self._journal.write('\n')
+
+    def read(self):
+        try:
+            with open(self.file_name, 'r') as journal:
+                for line in journal:
+                    try:
+                        entry = json.loads(line)
+                    except json.decoder.JSONDecodeError:
+                        continue
+                    record_id = str(entry['id'])
+                    if entry['status'] == 'done':
+                        self.completed.add(record_id)
+                        self.failed.pop(record_id, None)
+                    else:
+                        self.failed[record_id] = entry.get('error')
+        except FileNotFoundError:
+            pass
+        logger.debug(f"checkpoint {self.file_name}: {len(self.completed)} completed, {len(self.failed)} failed")
+
+    def _ends_with_newline(self) -> bool:
+        with open(self.file_name, 'rb') as journal:
+            journal.seek(-1, os.SEEK_END)
+            return journal.read(1) == b'\n'
+
+    def _append(self, record_id: str, status: str, error: Union[str, None] = None):
+        entry = dict(id=record_id, status=status, time=time.time())
+        if error is not None:
+            entry['error'] = error
+        with self._lock:
+            self._journal.write(json.dumps(entry) + '\n')
+            self._journal.flush()
+            if status == 'done':
+                self.completed.add(record_id)
+                self.failed.pop(record_id, None)
+            else:
+                self.failed[record_id] = error
+
+    def done(self, record_id):
+        self._append(str(record_id), 'done')
+
+    def fail(self, record_id, error: Union[str, Exception, None] = None):
+        self._append(str(record_id), 'failed', str(error) if error is not None else None)
+
+    def is_done(self, record_id) -> bool:
+        return str(record_id) in self.completed
+
+    def is_failed(self, record_id) -> bool:
+        return str(record_id) in self.failed
+
+    def close(self):
+        with self._lock:
+            self._journal.close()
@@ -0,0 +1,102 @@
+##
+##
+
+import time
+import queue
+import logging
+import threading
+import concurrent.futures
+from typing import Callable, List, Union
+from moviedemo.google_embedding import EmbeddingClient
+
+logger = logging.getLogger('moviedemo.coalescer')
+logger.addHandler(logging.NullHandler())
+STOP = object()
+
+
+class EmbeddingTimeout(RuntimeError):
+    pass
+
+
+class EmbeddingCoalescer(object):
+
+    def __init__(self,
+                 max_wait: float = 0.01,
+                 max_batch: int = 16,
+                 concurrency: int = 8,
+                 embed: Union[Callable[[str, int], List[float]], None] = None,
+                 timeout: Union[float, None] = None):
+        self.max_wait = max_wait
+        self.timeout = timeout
+        self.max_batch = max(1, max_batch)
+        self.embed_func = embed if embed else lambda text, dimension: EmbeddingClient.instance().get_text_embeddings(text, dimension)
+        self.requests = 0
+        self.batches = 0
+        self.calls = 0
+        self._queue = queue.Queue()
+        self._executor = concurrent.futures.ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix='coalescer')
+        self._thread = threading.Thread(target=self._dispatch, name='coalescer', daemon=True)
+        self._thread.start()
+
+    def submit(self, text: str, dimension: int = 1408) -> concurrent.futures.Future:
+        future = concurrent.futures.Future()
+        self._queue.put((text, dimension, future))
+        return future
+
+    def embed(self, text: str, dimension: int = 1408) -> List[float]:
+        future = self.submit(text, dimension)
+        try:
+            return future.result(timeout=self.timeout)
+        except concurrent.futures.TimeoutError:
+            if future.done():
+                raise
+            raise EmbeddingTimeout(f"no embedding after {self.timeout} seconds")
+
+    def _collect(self) -> Union[list, None]:
+        item = self._queue.get()
+        if item is STOP:
+            return None
+        batch = [item]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch:
+            remaining = deadline - time.monotonic()
+            try:
+                item = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is STOP:
+                self._queue.put(STOP)
+                break
+            batch.append(item)
+        return batch
+
+    def _dispatch(self):
+        while True:
+            batch = self._collect()
+            if batch is None:
+                break
+            waiting = {}
+            for text, dimension, future in batch:
+                waiting.setdefault((text, dimension), []).append(future)
+            self.requests += len(batch)
+            self.batches += 1
+            self.calls += len(waiting)
+            logger.debug(f"dispatching batch of {len(batch)} requests as {len(waiting)} embedding calls")
+            for key, futures in waiting.items():
+                self._executor.submit(self._embed, key, futures)
+
+    def _embed(self, key: tuple, futures: List[concurrent.futures.Future]):
+        text, dimension = key
+        try:
+            vector = self.embed_func(text, dimension)
+        except Exception as err:
+            for future in futures:
+                future.set_exception(err)
+            return
+        for future in futures:
+            future.set_result(vector)
+
+    def close(self):
+        self._queue.put(STOP)
+        self._thread.join()
+        self._executor.shutdown()
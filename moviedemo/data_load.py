@@ -1,16 +1,30 @@
 #!/usr/bin/env python3
 
+import os
 import sys
-import time
+import threading
 from moviedemo.logformat import CustomLogFormatter
 from moviedemo.google_transform import GoogleEmbedding
-from cbcmgr.cb_transform import CBTransform
+from moviedemo.google_embedding import EmbeddingClient, EMBEDDING_MODEL
+from moviedemo.ratelimit import RateLimiter
+from cbcmgr.cb_operation_s import CBOperation
 from moviedemo.check_image import CheckImage
+from moviedemo.pipeline import Pipeline, Stage
+from moviedemo.image_cache import ImageCache, DEFAULT_CACHE_SIZE
+from moviedemo.embedding_store import EmbeddingStore
 from moviedemo.capella import create_bucket
-import json
+from moviedemo.datafile import DataFile, DataWriter
+from moviedemo.checkpoint import Checkpoint
+from moviedemo.manifest import Manifest, fingerprint
+from moviedemo.storage_profile import StorageProfile, DIMENSIONS, ENCODINGS
+from moviedemo.search import bump_generation
+from moviedemo.metrics import Metrics
+from couchbase.exceptions import DocumentNotFoundException
+import time
 import logging
 import warnings
 import argparse
+from typing import List, Union
 
 warnings.filterwarnings("ignore")
 logger = logging.getLogger()
@@ -23,6 +37,7 @@ logger.setLevel(logging.INFO)
 
 
 def progress_bar(iteration, total, decimals=1, length=100, fill='#', errors=0, ops_per_sec=0.0, end="\r"):
+    total = max(total, iteration, 1)
     percent = ("{0:." + str(decimals) + "f}").format(100 * (iteration / float(total)))
     filled = int(length * iteration // total)
     bar = fill * filled + '-' * (length - filled)
@@ -31,6 +46,115 @@ def progress_bar(iteration, total, decimals=1, length=100, fill='#', errors=0, o
         print()
 
 
+class MovieLoader(object):
+
+    def __init__(self,
+                 op: Union[CBOperation, None],
+                 cache: ImageCache,
+                 checkpoint: Checkpoint,
+                 resume: bool = False,
+                 retry_failed: bool = False,
+                 manifest: Union[Manifest, None] = None,
+                 export: Union[DataWriter, None] = None,
+                 profile: Union[StorageProfile, None] = None):
+        self.op = op
+        self.cache = cache
+        self.checkpoint = checkpoint
+        self.resume = resume
+        self.retry_failed = retry_failed
+        self.manifest = manifest
+        self.export = export
+        self.profile = profile if profile else StorageProfile()
+        self.seen = set()
+        self._export_lock = threading.Lock()
+        self._count_lock = threading.Lock()
+        self.unchanged = 0
+        self.written = 0
+        self.removed = 0
+
+    def stored_fingerprint(self, movie: dict) -> Union[str, None]:
+        value = self.manifest.get(movie['id'])
+        if value is None and self.op:
+            try:
+                value = self.op.get_doc(self.op.collection, str(movie['id'])).get('fingerprint')
+            except DocumentNotFoundException:
+                return None
+            if value:
+                self.manifest.update(movie['id'], value)
+        return value
+
+    def skip(self, movie: dict) -> bool:
+        if self.manifest:
+            self.seen.add(str(movie['id']))
+        if self.retry_failed:
+            return not self.checkpoint.is_failed(movie['id'])
+        if self.resume and self.checkpoint.is_done(movie['id']):
+            return True
+        if self.manifest:
+            if self.stored_fingerprint(movie) == fingerprint(movie, model=EMBEDDING_MODEL, **self.profile.settings):
+                self.unchanged += 1
+                return True
+        return False
+
+    def fetch(self, movie: dict):
+        if not movie['title'].isascii() or self.skip(movie):
+            return None
+        return dict(movie=movie, image_bytes=self.cache.get(movie['poster_path']))
+
+    def validate(self, item: dict):
+        movie = item['movie']
+        image_type = CheckImage.check_image_bytes(item['image_bytes'])
+        if not image_type or image_type not in CheckImage.SUPPORTED_FORMATS:
+            logger.error(f"Skipping \"{movie['title']}\" due to failed image check: Image type: {image_type}")
+            self.checkpoint.fail(movie['id'], f"image check failed: {image_type}")
+            return None
+        return item
+
+    def embed(self, item: dict):
+        item['record_id'], item['document'] = GoogleEmbedding(image_bytes=item['image_bytes'], profile=self.profile).transform(item['movie'])
+        return item
+
+    def write(self, item: dict):
+        if self.op:
+            with Metrics.instance().timer('database.write'):
+                self.op.put_doc(self.op.collection, item['record_id'], item['document'])
+        if self.export:
+            with self._export_lock:
+                self.export.write([dict(item['document'], id=item['record_id'])])
+        self.checkpoint.done(item['movie']['id'])
+        if self.manifest:
+            self.manifest.update(item['record_id'], item['document']['fingerprint'])
+        with self._count_lock:
+            self.written += 1
+        return item
+
+    def stages(self, workers: int, fetch_workers: Union[int, None] = None, embed_workers: Union[int, None] = None, write_workers: Union[int, None] = None) -> List[Stage]:
+        return [
+            Stage('fetch', self.fetch, fetch_workers or workers),
+            Stage('validate', self.validate, 1),
+            Stage('embed', self.embed, embed_workers or workers),
+            Stage('write', self.write, write_workers or workers),
+        ]
+
+    def delete_removed(self) -> int:
+        removed = self.manifest.ids() - self.seen
+        for record_id in removed:
+            if self.op:
+                try:
+                    self.op.collection.remove(record_id)
+                except DocumentNotFoundException:
+                    pass
+            self.manifest.remove(record_id)
+            logger.info(f"Removed record {record_id} that is no longer in the source data")
+        self.removed += len(removed)
+        return len(removed)
+
+    def failed(self, stage: str, item, err: Exception):
+        movie = item['movie'] if 'movie' in item else item
+        logger.error(f"Stage {stage} failed for \"{movie.get('title')}\" ({movie.get('id')}): {err}")
+        self.checkpoint.fail(movie.get('id'), f"{stage}: {err}")
+
+
 def main():
     parser = argparse.ArgumentParser(add_help=False)
     parser.add_argument('-u', '--user', action='store', help="User Name", default="Administrator")
@@ -43,15 +167,37 @@ def main():
     parser.add_argument('-P', '--project', action='store', help="Project Name")
     parser.add_argument('-D', '--database', action='store', help="Capella Database")
     parser.add_argument('-R', '--profile', action='store', help="Capella API Profile", default="default")
+    parser.add_argument('--cache-dir', action='store', help="Image Cache Directory")
+    parser.add_argument('--cache-size', action='store', help="Image Cache Size (MiB)", type=int, default=DEFAULT_CACHE_SIZE)
+    parser.add_argument('--revalidate', action='store_true', help="Revalidate Cached Images")
+    parser.add_argument('--embedding-dir', action='store', help="Embedding Store Directory")
+    parser.add_argument('--rpm', action='store', help="Vertex Requests per Minute", type=float, default=120)
+    parser.add_argument('--burst', action='store', help="Vertex Request Burst", type=int, default=5)
+    parser.add_argument('--checkpoint', action='store', help="Checkpoint Journal File")
+    parser.add_argument('--resume', action='store_true', help="Skip Records Completed in a Previous Run")
+    parser.add_argument('--retry-failed', action='store_true', help="Only Process Records That Failed in a Previous Run")
+    parser.add_argument('--delta', action='store_true', help="Only Load New or Changed Records")
+    parser.add_argument('--manifest', action='store', help="Delta Manifest File")
+    parser.add_argument('--delete-removed', action='store_true', help="Delete Records Missing from the Data File (with --delta)")
+    parser.add_argument('--export', action='store', help="Write Loaded Documents to a JSON Lines File")
+    parser.add_argument('--offline', action='store_true', help="Do Not Write to the Cluster (use with --export)")
+    parser.add_argument('--dimension', action='store', help="Embedding Dimension", type=int, choices=DIMENSIONS, default=1408)
+    parser.add_argument('--encoding', action='store', help="Embedding Storage Encoding", choices=ENCODINGS, default='float32')
+    parser.add_argument('--metrics', action='store_true', help="Write a Stage Timing Summary Next to run.log")
+    parser.add_argument('-w', '--workers', action='store', help="Workers per Stage", type=int, default=4)
+    parser.add_argument('--fetch-workers', action='store', help="Poster Fetch Workers", type=int)
+    parser.add_argument('--embed-workers', action='store', help="Embedding Workers", type=int)
+    parser.add_argument('--write-workers', action='store', help="Database Write Workers", type=int)
     options = parser.parse_args()
 
     try:
-        with open(options.file, 'r') as input_file:
-            data = json.load(input_file)
+        data = DataFile(options.file)
     except FileNotFoundError:
         print(f"Data file {options.file} not found")
         sys.exit(1)
 
+    EmbeddingClient.instance().limiter = RateLimiter(options.rpm, options.burst)
+
     try:
         GoogleEmbedding().get_text_embeddings("test")
     except Exception as err:
@@ -59,34 +205,96 @@ def main():
         print(f"Error: {err}")
         sys.exit(1)
 
-    if options.project and options.database:
+    if options.offline and not options.export:
+        print("The --offline option requires --export")
+        sys.exit(1)
+
+    if options.export and (options.delta or options.resume or options.retry_failed):
+        print("The --export option writes a complete export and can not be used with --delta, --resume or --retry-failed")
+        sys.exit(1)
+
+    profile = StorageProfile(options.dimension, options.encoding)
+    if not profile.indexable and not options.offline:
+        print(f"The search service can not index {options.encoding} vectors, use --offline with a local search backend or choose float32 or base64")
+        sys.exit(1)
+
+    if options.project and options.database and not options.offline:
         create_bucket(options.profile, options.project, options.database, options.bucket, 1024, 1)
 
     keyspace = f"{options.bucket}.{options.scope}.{options.collection}"
 
-    pool = CBTransform(options.host, options.user, options.password, ssl=True, quota=1024, create=True, replicas=1, keyspace=keyspace)
+    op = None
+    if not options.offline:
+        op = CBOperation(options.host, options.user, options.password, ssl=True, quota=1024, create=True, replicas=1)
+        op.connect(keyspace)
 
-    data_length = len(data)
-    progress_bar(0, data_length, length=50)
-    for n, movie in enumerate(data):
-        poster_url = movie['poster_path']
+    export = DataWriter(options.export, 'jsonl') if options.export else None
+
+    cache = ImageCache.configure(options.cache_dir, options.cache_size, options.revalidate)
+    EmbeddingStore.configure(options.embedding_dir)
+
+    checkpoint_file = options.checkpoint if options.checkpoint else f"{os.path.basename(options.file)}.checkpoint"
+    checkpoint = Checkpoint(checkpoint_file, reset=not (options.resume or options.retry_failed))
 
-        if not movie['title'].isascii():
-            continue
+    manifest = None
+    if options.delta:
+        manifest_file = options.manifest if options.manifest else f"{keyspace}.manifest.json"
+        manifest = Manifest(manifest_file)
 
-        result = CheckImage().check_image_url(poster_url)
-        if not result or result not in ("BMP", "GIF", "JPEG", "PNG"):
-            logger.error(f"Skipping \"{movie['title']}\" due to failed image check: Image type: {result}")
-            continue
+    loader = MovieLoader(op, cache, checkpoint, options.resume, options.retry_failed, manifest, export, profile)
+    stages = loader.stages(options.workers, options.fetch_workers, options.embed_workers, options.write_workers)
+
+    metrics = Metrics.configure(enabled=options.metrics)
+    start_time = time.time()
+
+    data_length = data.total
+    progress_bar(0, data_length, length=50)
+    pipeline = Pipeline(stages,
+                        queue_size=options.workers * 4,
+                        on_progress=lambda p: progress_bar(p.completed, data_length, length=50, errors=p.errors, ops_per_sec=p.ops_per_sec),
+                        on_error=loader.failed)
+    pipeline.run(data)
+    load_rate = pipeline.ops_per_sec
+    if pipeline.completed != data_length:
+        progress_bar(pipeline.completed, pipeline.completed, length=50, errors=pipeline.errors, ops_per_sec=pipeline.ops_per_sec)
+    checkpoint.close()
+    if manifest:
+        if options.delete_removed and not options.retry_failed:
+            removed = loader.delete_removed()
+            print(f"Removed {removed} records no longer present in {options.file}")
+        manifest.save()
+        print(f"Skipped {loader.unchanged} unchanged records")
+    if checkpoint.failed:
+        print(f"{len(checkpoint.failed)} records failed, rerun with --retry-failed to reprocess them")
 
-        pool.dispatch(movie, GoogleEmbedding)
-        if pool.ops_per_sec > 1.75:
-            ops_diff = pool.ops_per_sec - 1.75
-            time.sleep(ops_diff)
-        progress_bar(n + 1, data_length, length=50, errors=pool.error_count, ops_per_sec=pool.ops_per_sec)
+    if export:
+        export.close()
+    if op:
+        if loader.written or loader.removed:
+            bump_generation(op)
+        with metrics.timer('index.create'):
+            profile.vector_index(op, "movie_vector", "image_embedding")
 
-    pool.join()
-    pool.vector_index(f"movie_vector", 1408, "image_embedding")
+    if options.metrics:
+        limiter = EmbeddingClient.instance().limiter
+        store = EmbeddingStore.instance()
+        metrics_file = os.path.join(os.path.dirname(os.path.abspath(file_handler.baseFilename)), "run-metrics.json")
+        metrics.save(metrics_file,
+                     data_file=options.file,
+                     started=time.strftime("%Y-%m-%dT%H:%M:%S%z", time.localtime(start_time)),
+                     duration_seconds=round(time.time() - start_time, 3),
+                     records=pipeline.completed,
+                     errors=pipeline.errors,
+                     records_per_sec=round(load_rate, 2),
+                     workers={stage.name: stage.workers for stage in stages},
+                     image_cache=dict(hits=cache.hits, misses=cache.misses),
+                     retries=dict(image_download=metrics.counters.get('http.retries', 0),
+                                  embedding_throttled=metrics.counters.get('embedding.throttled', 0)),
+                     embedding_store=dict(hits=store.hits, misses=store.misses),
+                     rate_limit=dict(requests_per_minute=round(limiter.requests_per_minute, 2),
+                                     throttle_count=limiter.throttle_count,
+                                     wait_seconds=round(limiter.wait_time, 3)))
+        print(f"Wrote run metrics to {metrics_file}")
 
 
 if __name__ == '__main__':
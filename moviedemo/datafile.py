@@ -0,0 +1,243 @@
+##
+##
+
+import io
+import os
+import gzip
+import json
+import logging
+from typing import Iterator, Tuple, TextIO, Iterable, Union
+
+logger = logging.getLogger('moviedemo.datafile')
+logger.addHandler(logging.NullHandler())
+CHUNK_SIZE = 65536
+WHITESPACE = ' \t\n\r'
+GZIP_MAGIC = b'\x1f\x8b'
+ZSTD_MAGIC = b'\x28\xb5\x2f\xfd'
+
+
+def zstd_module():
+    try:
+        import zstandard
+    except ImportError:
+        raise RuntimeError("zstd compression requires the zstandard package (pip install zstandard)")
+    return zstandard
+
+
+def file_compression(file_name: str) -> Union[str, None]:
+    try:
+        with open(file_name, 'rb') as data_file:
+            magic = data_file.read(4)
+    except FileNotFoundError:
+        magic = b''
+    if magic.startswith(GZIP_MAGIC) or (not magic and file_name.endswith('.gz')):
+        return 'gzip'
+    if magic.startswith(ZSTD_MAGIC) or (not magic and file_name.endswith('.zst')):
+        return 'zstd'
+    return None
+
+
+def open_data_file(file_name: str, mode: str = 'r') -> TextIO:
+    if mode == 'r':
+        compression = file_compression(file_name)
+    elif file_name.endswith('.gz'):
+        compression = 'gzip'
+    elif file_name.endswith('.zst'):
+        compression = 'zstd'
+    else:
+        compression = None
+
+    if compression == 'gzip':
+        return gzip.open(file_name, f"{mode}t", encoding='utf-8')
+    if compression == 'zstd':
+        zstandard = zstd_module()
+        raw = open(file_name, f"{mode}b")
+        if mode == 'r':
+            stream = zstandard.ZstdDecompressor().stream_reader(raw, closefd=True)
+        else:
+            stream = zstandard.ZstdCompressor().stream_writer(raw, closefd=True)
+        return io.TextIOWrapper(stream, encoding='utf-8')
+    return open(file_name, mode, encoding='utf-8')
+
+
+class DataFile(object):
+
+    def __init__(self, file_name: str, chunk_size: int = CHUNK_SIZE, sample_size: int = 100):
+        self.file_name = file_name
+        self.chunk_size = chunk_size
+        self.sample_size = sample_size
+        self.file_size = os.path.getsize(file_name)
+        self.compression = file_compression(file_name)
+        self.format = self.detect_format()
+        self.estimated = False
+        self.truncated = False
+        self._total = None
+
+    def open(self) -> TextIO:
+        self.truncated = False
+        return open_data_file(self.file_name, 'r')
+
+    def read(self, data_file: TextIO, size: int) -> str:
+        try:
+            return data_file.read(size)
+        except EOFError:
+            self.stream_truncated()
+            return ''
+
+    def stream_truncated(self):
+        self.truncated = True
+        logger.warning(f"{self.file_name}: compressed stream is truncated, the file may be incomplete")
+
+    def detect_format(self) -> str:
+        with self.open() as data_file:
+            while True:
+                c = self.read(data_file, 1)
+                if not c:
+                    return 'jsonl'
+                if c in WHITESPACE:
+                    continue
+                return 'json' if c == '[' else 'jsonl'
+
+    def __iter__(self) -> Iterator[dict]:
+        if self.format == 'json':
+            for record, _ in self.iter_array():
+                yield record
+        else:
+            yield from self.iter_lines()
+
+    def iter_lines(self) -> Iterator[dict]:
+        with self.open() as data_file:
+            lines = enumerate(data_file, start=1)
+            while True:
+                try:
+                    line_number, line = next(lines)
+                except StopIteration:
+                    return
+                except EOFError:
+                    self.stream_truncated()
+                    return
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    yield json.loads(line)
+                except json.decoder.JSONDecodeError as err:
+                    raise ValueError(f"{self.file_name} line {line_number}: {err}")
+
+    def iter_array(self) -> Iterator[Tuple[dict, int]]:
+        decoder = json.JSONDecoder()
+        consumed = 0
+        with self.open() as data_file:
+            buffer = ''
+            position = 0
+            eof = False
+            started = False
+            while True:
+                while position < len(buffer) and (buffer[position] in WHITESPACE or (started and buffer[position] == ',')):
+                    position += 1
+                if position >= len(buffer):
+                    if eof and started:
+                        logger.warning(f"{self.file_name}: array is not terminated, the file may be incomplete")
+                        return
+                    if eof:
+                        raise ValueError(f"{self.file_name}: unexpected end of file")
+                    consumed += position
+                    buffer = self.read(data_file, self.chunk_size)
+                    position = 0
+                    eof = not buffer
+                    continue
+                if not started:
+                    if buffer[position] != '[':
+                        raise ValueError(f"{self.file_name}: expected a JSON array")
+                    started = True
+                    position += 1
+                    continue
+                if buffer[position] == ']':
+                    return
+                try:
+                    record, end = decoder.raw_decode(buffer, position)
+                except json.decoder.JSONDecodeError:
+                    if eof and self.truncated:
+                        return
+                    if eof:
+                        raise
+                    chunk = self.read(data_file, self.chunk_size)
+                    eof = not chunk
+                    consumed += position
+                    buffer = buffer[position:] + chunk
+                    position = 0
+                    continue
+                position = end
+                yield record, consumed + position
+
+    @property
+    def total(self) -> int:
+        if self._total is None:
+            self._total = self.count()
+        return self._total
+
+    def count(self) -> int:
+        if self.format == 'jsonl' and self.compression:
+            return sum(1 for _ in self.iter_lines())
+
+        if self.format == 'jsonl':
+            lines = 0
+            last = '\n'
+            with self.open() as data_file:
+                for block in iter(lambda: self.read(data_file, 1048576), ''):
+                    lines += block.count('\n')
+                    last = block[-1:]
+            return lines if last == '\n' else lines + 1
+
+        if self.compression:
+            return sum(1 for _ in self.iter_array())
+
+        sample = 0
+        consumed = 0
+        for n, (_, consumed) in enumerate(self.iter_array(), start=1):
+            sample = n
+            if n >= self.sample_size:
+                break
+        if sample < self.sample_size or consumed == 0:
+            return sample
+        self.estimated = True
+        estimate = int(self.file_size * sample / consumed)
+        logger.debug(f"estimated {estimate} records in {self.file_name} from {sample} sampled records")
+        return estimate
+
+
+class DataWriter(object):
+
+    def __init__(self, file_name: str, data_format: Union[str, None] = None):
+        self.file_name = file_name
+        if data_format:
+            self.format = data_format
+        else:
+            self.format = 'jsonl' if '.jsonl' in os.path.basename(file_name) else 'json'
+        self.count = 0
+        self._stream = open_data_file(file_name, 'w')
+        if self.format == 'json':
+            self._stream.write('[')
+
+    def write(self, records: Iterable[dict]):
+        for record in records:
+            if self.format == 'json':
+                self._stream.write(',\n' if self.count else '\n')
+                self._stream.write(json.dumps(record))
+            else:
+                self._stream.write(json.dumps(record) + '\n')
+            self.count += 1
+        self._stream.flush()
+
+    def close(self, complete: bool = True):
+        if self._stream.closed:
+            return
+        if self.format == 'json' and complete:
+            self._stream.write('\n]\n')
+        self._stream.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
@@ -2,18 +2,73 @@
 ##
 ##
 
+import time
 import logging
 import argparse
 from cbcmgr.cb_operation_s import CBOperation
-from moviedemo.google_embedding import GoogleEmbedding
+from moviedemo.google_embedding import EmbeddingClient
+from moviedemo.search import SearchBackend, CouchbaseSearch, LocalSearch, VECTOR_FIELDS
+from moviedemo.storage_profile import DIMENSIONS
+from moviedemo.embedding_store import EmbeddingStore
+from moviedemo.cache import QueryEmbeddingCache, ResultCache
+from moviedemo.coalescer import EmbeddingCoalescer, EmbeddingTimeout
+from moviedemo.metrics import Metrics
 from flask import Flask
 from flask import render_template
 from flask import send_file
 from flask import request
+from flask import jsonify
+from flask import Response
+from flask import g
 from waitress import serve
 
-op: CBOperation
+backend: SearchBackend
+dimension: int = 1408
 app = Flask(__name__)
+API_FIELDS = ('title', 'release_date', 'popularity', 'imdb_id', 'overview', 'poster_path', 'backdrop_path')
+MAX_RESULTS = 100
+
+
+def embed_question(question: str):
+    with Metrics.instance().timer('search.embedding'):
+        return QueryEmbeddingCache.instance().get_text_embeddings(question, dimension)
+
+
+def vector_search(vector, field: str = 'image_embedding', k: int = 2, fields=None):
+    with Metrics.instance().timer('search.vector_search'):
+        return backend.search(vector, field, k, fields)
+
+
+@app.before_request
+def start_request():
+    g.start_time = time.perf_counter()
+    Metrics.instance().add_gauge('http.in_flight', 1)
+
+
+@app.after_request
+def record_request(response):
+    route = request.url_rule.rule if request.url_rule else 'unmatched'
+    metrics = Metrics.instance()
+    metrics.observe('http.request', time.perf_counter() - g.start_time, route=route)
+    metrics.increment('http.requests', route=route, status=response.status_code)
+    return response
+
+
+@app.teardown_request
+def finish_request(err):
+    metrics = Metrics.instance()
+    metrics.add_gauge('http.in_flight', -1)
+    if err is not None:
+        metrics.increment('http.errors', type=type(err).__name__)
+
+
+@app.errorhandler(EmbeddingTimeout)
+def embedding_timeout(err):
+    Metrics.instance().increment('http.errors', type=type(err).__name__)
+    message = "timed out waiting for the embedding service"
+    if request.path.startswith('/api/'):
+        return jsonify(error=message), 503
+    return Response(f"{message.capitalize()}, please try again.", status=503, mimetype='text/plain')
 
 
 @app.route("/")
@@ -32,13 +87,73 @@ def results():
     question = request.form['question']
     app.logger.info(f"asked question {question}")
 
-    vector = GoogleEmbedding().get_text_embeddings(question)
+    vector = embed_question(question)
 
-    movies = op.vector_search('movie_vector', 'image_embedding', vector)
+    movies = vector_search(vector, 'image_embedding')
 
     return render_template("results.html", result_list=movies)
 
 
+@app.route("/api/search", methods=['POST'])
+def api_search():
+    body = request.get_json(silent=True)
+    if not isinstance(body, dict):
+        return jsonify(error="request body must be a JSON object"), 400
+
+    question = body.get('question')
+    vector = body.get('vector')
+    field = body.get('field', 'image_embedding')
+    fields = body.get('fields')
+    try:
+        k = int(body.get('k', 2))
+    except (TypeError, ValueError):
+        return jsonify(error="k must be an integer"), 400
+
+    if not 0 < k <= MAX_RESULTS:
+        return jsonify(error=f"k must be between 1 and {MAX_RESULTS}"), 400
+    if field not in VECTOR_FIELDS:
+        return jsonify(error=f"field must be one of {', '.join(VECTOR_FIELDS)}"), 400
+    if not backend.has_field(field):
+        return jsonify(error=f"field {field} is not searchable on this server"), 400
+    if fields is None:
+        fields = API_FIELDS
+    elif not isinstance(fields, list) or not all(isinstance(name, str) for name in fields):
+        return jsonify(error="fields must be a list of field names"), 400
+
+    if vector is not None:
+        if not isinstance(vector, list) or len(vector) != dimension or not all(isinstance(value, (int, float)) for value in vector):
+            return jsonify(error=f"vector must be a list of {dimension} numbers"), 400
+    elif isinstance(question, str) and question.strip():
+        app.logger.info(f"api question {question}")
+        vector = embed_question(question)
+    else:
+        return jsonify(error="either question or vector is required"), 400
+
+    movies = vector_search(vector, field, k, fields)
+
+    return jsonify(count=len(movies), results=movies)
+
+
+@app.route("/metrics")
+def metrics_endpoint():
+    return Response(Metrics.instance().prometheus(), mimetype='text/plain; version=0.0.4')
+
+
+def register_gauges(coalescer: EmbeddingCoalescer):
+    metrics = Metrics.instance()
+    query_cache = QueryEmbeddingCache.instance()
+    metrics.register_gauge('query_cache.hits', lambda: query_cache.hits)
+    metrics.register_gauge('query_cache.misses', lambda: query_cache.misses)
+    metrics.register_gauge('query_cache.hit_ratio', lambda: query_cache.memory.hit_ratio)
+    metrics.register_gauge('coalescer.requests', lambda: coalescer.requests)
+    metrics.register_gauge('coalescer.calls', lambda: coalescer.calls)
+    if isinstance(backend, ResultCache):
+        metrics.register_gauge('result_cache.hits', lambda: backend.results.hits)
+        metrics.register_gauge('result_cache.misses', lambda: backend.results.misses)
+        metrics.register_gauge('result_cache.hit_ratio', lambda: backend.results.hit_ratio)
+        metrics.register_gauge('result_cache.invalidations', lambda: backend.invalidations)
+
+
 def parse_args():
     parser = argparse.ArgumentParser(add_help=False)
     parser.add_argument('-P', '--port', action='store', default=8080)
@@ -48,6 +163,22 @@ def parse_args():
     parser.add_argument('-b', '--bucket', action='store', help="Bucket", default="movies")
     parser.add_argument('-s', '--scope', action='store', help="Scope", default="data")
     parser.add_argument('-c', '--collection', action='store', help="Collection", default="data")
+    parser.add_argument('-L', '--local', action='store', help="Search Documents in a Local File Instead of the Cluster")
+    parser.add_argument('-I', '--index', action='store', help="Local ANN Index Directory (with --local)")
+    parser.add_argument('-n', '--nprobe', action='store', help="ANN Lists Probed per Query", type=int)
+    parser.add_argument('--dimension', action='store', help="Embedding Dimension", type=int, choices=DIMENSIONS, default=1408)
+    parser.add_argument('--query-cache-size', action='store', help="Cached Query Embeddings", type=int, default=1024)
+    parser.add_argument('--query-cache-ttl', action='store', help="Query Embedding Cache TTL (seconds)", type=float, default=3600)
+    parser.add_argument('--query-cache-dir', action='store', help="Persistent Query Embedding Cache Directory")
+    parser.add_argument('-t', '--threads', action='store', help="Server Worker Threads", type=int, default=16)
+    parser.add_argument('--embed-timeout', action='store', help="Query Embedding Timeout (seconds)", type=float, default=30)
+    parser.add_argument('--batch-wait', action='store', help="Query Embedding Batch Window (ms)", type=float, default=10)
+    parser.add_argument('--batch-size', action='store', help="Maximum Query Embedding Batch Size", type=int, default=16)
+    parser.add_argument('--embed-concurrency', action='store', help="Concurrent Query Embedding Calls", type=int, default=8)
+    parser.add_argument('--result-cache-size', action='store', help="Cached Search Results (0 to Disable)", type=int, default=256)
+    parser.add_argument('--result-cache-ttl', action='store', help="Search Result Cache TTL (seconds)", type=float, default=300)
+    parser.add_argument('--generation-interval', action='store', help="Data Change Check Interval (seconds)", type=float, default=5.0)
+    parser.add_argument('--no-metrics', action='store_true', help="Disable Request Metrics")
     parser.add_argument('-d', '--debug', action='store_true', help="Debug")
     parser.add_argument('-?', action='help')
     args = parser.parse_args()
@@ -55,14 +186,31 @@ def parse_args():
 
 
 def main():
-    global op
+    global backend, dimension
     options = parse_args()
-    keyspace = f"{options.bucket}.{options.scope}.{options.collection}"
-    op = CBOperation(options.host, options.user, options.password, ssl=True, quota=1024, create=True, replicas=0)
-    op.connect(keyspace)
+    dimension = options.dimension
+    Metrics.configure(enabled=not options.no_metrics)
+    if options.local:
+        backend = LocalSearch.from_file(options.local, vector_fields=() if options.index else VECTOR_FIELDS)
+        if options.index:
+            index = backend.load_index(options.index, 'image_embedding', options.local)
+            if options.nprobe:
+                index.nprobe = options.nprobe
+    else:
+        keyspace = f"{options.bucket}.{options.scope}.{options.collection}"
+        op = CBOperation(options.host, options.user, options.password, ssl=True, quota=1024, create=True, replicas=0)
+        op.connect(keyspace)
+        backend = CouchbaseSearch(op)
+    if options.result_cache_size > 0:
+        backend = ResultCache(backend, options.result_cache_size, options.result_cache_ttl, options.generation_interval)
+    store = EmbeddingStore(options.query_cache_dir) if options.query_cache_dir else None
+    coalescer = EmbeddingCoalescer(options.batch_wait / 1000.0, options.batch_size, options.embed_concurrency, timeout=options.embed_timeout)
+    QueryEmbeddingCache.configure(options.query_cache_size, options.query_cache_ttl, store, coalescer.embed)
+    register_gauges(coalescer)
+    EmbeddingClient.instance().initialize()
     logger = logging.getLogger('waitress')
     logger.setLevel(logging.INFO)
-    serve(app, host='0.0.0.0', port=options.port)
+    serve(app, host='0.0.0.0', port=options.port, threads=options.threads)
 
 
 if __name__ == '__main__':
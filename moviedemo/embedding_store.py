@@ -0,0 +1,146 @@
+##
+##
+
+import os
+import json
+import mmap
+import hashlib
+import logging
+import threading
+from array import array
+from pathlib import Path
+from contextlib import contextmanager
+from typing import Optional, Tuple, List, Union
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+logger = logging.getLogger('moviedemo.embedding_store')
+logger.addHandler(logging.NullHandler())
+DEFAULT_STORE_DIR = os.path.join(Path.home(), '.moviedemo', 'embeddings')
+FLOAT_SIZE = array('f').itemsize
+
+
+class EmbeddingStore(object):
+    _instance = None
+    _instance_lock = threading.Lock()
+
+    def __init__(self, store_dir: Union[str, None] = None):
+        self.store_dir = store_dir if store_dir else DEFAULT_STORE_DIR
+        self.vector_file = os.path.join(self.store_dir, 'vectors.f32')
+        self.index_file = os.path.join(self.store_dir, 'index.jsonl')
+        self.hits = 0
+        self.misses = 0
+        self._index = {}
+        self._map = None
+        self._lock = threading.Lock()
+
+        os.makedirs(self.store_dir, exist_ok=True)
+        self._vectors = open(self.vector_file, 'ab')
+        self._reader = open(self.vector_file, 'rb')
+        self._journal = open(self.index_file, 'a')
+        self._load_index()
+
+    @classmethod
+    def configure(cls, *args, **kwargs):
+        with cls._instance_lock:
+            cls._instance = cls(*args, **kwargs)
+            return cls._instance
+
+    @classmethod
+    def instance(cls):
+        with cls._instance_lock:
+            if cls._instance is None:
+                cls._instance = cls()
+            return cls._instance
+
+    @staticmethod
+    def make_key(model: str, dimension: int, image_bytes: Optional[bytes], text: Optional[str]) -> str:
+        image_hash = hashlib.sha256(image_bytes).hexdigest() if image_bytes is not None else ''
+        text_hash = hashlib.sha256(text.encode('utf-8')).hexdigest() if text is not None else ''
+        return hashlib.sha256(f"{model}:{dimension}:{image_hash}:{text_hash}".encode('utf-8')).hexdigest()
+
+    def _load_index(self):
+        data_size = os.path.getsize(self.vector_file)
+        with open(self.index_file, 'r') as index_file:
+            for line in index_file:
+                try:
+                    entry = json.loads(line)
+                except json.decoder.JSONDecodeError:
+                    continue
+                end = entry['offset'] + (entry['image'] + entry['text']) * FLOAT_SIZE
+                if end > data_size:
+                    continue
+                self._index[entry['key']] = (entry['offset'], entry['image'], entry['text'])
+        logger.debug(f"loaded {len(self._index)} embeddings from {self.store_dir}")
+
+    def _mapped(self, end: int) -> mmap.mmap:
+        view = self._map
+        if view is None or len(view) < end:
+            with self._lock:
+                if self._map is None or len(self._map) < end:
+                    self._map = mmap.mmap(self._reader.fileno(), 0, access=mmap.ACCESS_READ)
+                view = self._map
+        return view
+
+    @staticmethod
+    def _decode(buffer: bytes) -> Optional[List[float]]:
+        if not buffer:
+            return None
+        vector = array('f')
+        vector.frombytes(buffer)
+        return vector.tolist()
+
+    def get(self, key: str) -> Optional[Tuple[Optional[List[float]], Optional[List[float]]]]:
+        entry = self._index.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        offset, image_len, text_len = entry
+        split = offset + image_len * FLOAT_SIZE
+        end = split + text_len * FLOAT_SIZE
+        self.hits += 1
+        if end == offset:
+            return None, None
+        view = self._mapped(end)
+        return self._decode(view[offset:split]), self._decode(view[split:end])
+
+    @contextmanager
+    def _file_lock(self):
+        if fcntl is None:
+            yield
+            return
+        fcntl.flock(self._vectors.fileno(), fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(self._vectors.fileno(), fcntl.LOCK_UN)
+
+    def put(self, key: str, image_embedding: Optional[List[float]], text_embedding: Optional[List[float]] = None):
+        image_data = array('f', image_embedding if image_embedding else []).tobytes()
+        text_data = array('f', text_embedding if text_embedding else []).tobytes()
+        with self._lock:
+            if key in self._index:
+                return
+            with self._file_lock():
+                offset = os.fstat(self._vectors.fileno()).st_size
+                self._vectors.write(image_data + text_data)
+                self._vectors.flush()
+                entry = (offset, len(image_data) // FLOAT_SIZE, len(text_data) // FLOAT_SIZE)
+                self._journal.write(json.dumps(dict(key=key, offset=entry[0], image=entry[1], text=entry[2])) + '\n')
+                self._journal.flush()
+            self._index[key] = entry
+
+    def __contains__(self, key: str) -> bool:
+        return key in self._index
+
+    def __len__(self) -> int:
+        return len(self._index)
+
+    def close(self):
+        with self._lock:
+            self._map = None
+            self._vectors.close()
+            self._reader.close()
+            self._journal.close()
@@ -1,45 +1,108 @@
 #!/usr/bin/env python3
 
+import os
 import logging
-import json
 import warnings
 import time
 import argparse
+from typing import List, Union
 from moviedemo.restmgr import RESTManager
+from moviedemo.datafile import DataWriter
 from moviedemo.logformat import CustomDisplayFormatter
 
 warnings.filterwarnings("ignore")
 logger = logging.getLogger()
 
 
+def parse_years(value: str) -> List[int]:
+    years = set()
+    for part in value.split(','):
+        if '-' in part:
+            first, last = part.split('-', 1)
+            years.update(range(int(first), int(last) + 1))
+        else:
+            years.add(int(part))
+    return sorted(years)
+
+
+class YearWriter(object):
+
+    def __init__(self, years: List[int], data_format: str = 'json', compression: Union[str, None] = None):
+        self.data_format = data_format
+        self.compression = compression
+        self.months = {year: 0 for year in years}
+        self.writers = {}
+        self.record_count = 0
+
+    def output_file(self, year: int) -> str:
+        extension = {None: '', 'gzip': '.gz', 'zstd': '.zst'}[self.compression]
+        return f"movie-data-{year}.{self.data_format}{extension}"
+
+    def add(self, year: int, month: int, movies: List[dict]):
+        if year not in self.writers:
+            logger.info(f"Writing records for year {year} to file {self.output_file(year)}")
+            self.writers[year] = DataWriter(self.output_file(year), self.data_format)
+        writer = self.writers[year]
+        writer.write(movies)
+        self.record_count += len(movies)
+        self.months[year] += 1
+        if self.months[year] == 12:
+            writer.close()
+            logger.info(f"Wrote {writer.count} records for year {year} to file {writer.file_name}")
+
+    def close(self):
+        for year, writer in self.writers.items():
+            if self.months[year] == 12:
+                writer.close()
+                continue
+            writer.close(complete=False)
+            partial_file = f"{writer.file_name}.partial"
+            os.replace(writer.file_name, partial_file)
+            logger.warning(f"Year {year} is incomplete with {self.months[year]} of 12 months, wrote {writer.count} records to {partial_file}")
+
+
 def main():
     parser = argparse.ArgumentParser(add_help=False)
     parser.add_argument('-h', '--host', action='store', help="API Host Name", default="api.themoviedb.org")
     parser.add_argument('-t', '--token', action='store', help="Token", default="tmdb.key")
     parser.add_argument('-y', '--year', action='store', help="Year", type=int, default=2023)
+    parser.add_argument('-Y', '--years', action='store', help="Years (e.g. 2015-2024 or 2019,2021)")
+    parser.add_argument('-F', '--format', action='store', help="Output Format", choices=['json', 'jsonl'], default='json')
+    parser.add_argument('-Z', '--compress', action='store', help="Output Compression", choices=['gzip', 'zstd'])
+    parser.add_argument('-C', '--connections', action='store', help="Connection Pool Size", type=int, default=100)
+    parser.add_argument('-i', '--in-flight', action='store', help="Maximum Concurrent Requests", type=int, default=40)
+    parser.add_argument('-M', '--months', action='store', help="Months Fetched Concurrently", type=int, default=3)
+    parser.add_argument('-r', '--rate', action='store', help="TMDB Requests per Second", type=float, default=40.0)
     options = parser.parse_args()
 
-    output_file = f"movie-data-{options.year}.json"
+    years = parse_years(options.years) if options.years else [options.year]
 
     screen_handler = logging.StreamHandler()
     screen_handler.setFormatter(CustomDisplayFormatter())
     logger.addHandler(screen_handler)
     logger.setLevel(logging.INFO)
 
-    rest = RESTManager(hostname=options.host, token_file=options.token)
+    rest = RESTManager(hostname=options.host,
+                       token_file=options.token,
+                       connection_limit=options.connections,
+                       max_in_flight=options.in_flight,
+                       requests_per_second=options.rate)
+
+    writer = YearWriter(years, options.format, options.compress)
 
     start_time = time.perf_counter()
-    movies = rest.get_tmdb_py_year(options.year)
+    try:
+        rest.get_tmdb_years(years, writer.add, options.months)
+    finally:
+        writer.close()
     end_time = time.perf_counter()
+    rest.close()
 
-    record_count = len(movies)
+    record_count = writer.record_count
     run_duration = end_time - start_time
     duration_string = time.strftime("%H hours %M minutes %S seconds.", time.gmtime(run_duration))
     ops_per_s = record_count / run_duration
     logger.info(f"Export completed in {duration_string} at {ops_per_s:.2f} records/sec")
-    logger.info(f"Writing {len(movies)} records for year {options.year} to file {output_file}")
-    with open(output_file, 'w') as json_file:
-        json.dump(movies, json_file, indent=2)
 
 
 if __name__ == '__main__':
@@ -1,32 +1,48 @@
 ##
 ##
 
-from typing import Optional, Tuple, List
+from typing import Optional, Tuple, List, Union, Iterable, Any
 import socket
+import asyncio
+import concurrent.futures
+import logging
+import threading
 import google.auth
+import google.auth.transport.requests
 import vertexai
+from google.api_core.exceptions import ResourceExhausted
+from moviedemo.ratelimit import RateLimiter
+from moviedemo.metrics import Metrics
 from vertexai.vision_models import (
     Image,
     MultiModalEmbeddingModel
 )
 
+logger = logging.getLogger('moviedemo.google_embedding')
+logger.addHandler(logging.NullHandler())
+EMBEDDING_MODEL = "multimodalembedding"
 
-class GoogleEmbedding:
 
-    def __init__(self, region: str = 'us-central1'):
-        self.gcp_account = None
+class EmbeddingClient(object):
+    _instance = None
+    _instance_lock = threading.Lock()
+
+    def __init__(self, region: str = 'us-central1', limiter: Union[RateLimiter, None] = None, max_retries: int = 10):
         self.gcp_project = None
         self.gcp_region = region
-        self.gcp_account_file = None
         self.gcp_account_email = None
-        self.gcp_zone_list = []
-        self.gcp_zone = None
-
-        socket.setdefaulttimeout(120)
-
-        self.credentials, self.gcp_project, self.gcp_account_email = self.default_auth()
-
-        vertexai.init(project=self.gcp_project, location=self.gcp_region, credentials=self.credentials)
+        self.credentials = None
+        self.limiter = limiter
+        self.max_retries = max_retries
+        self._model = None
+        self._lock = threading.Lock()
+
+    @classmethod
+    def instance(cls, region: str = 'us-central1'):
+        with cls._instance_lock:
+            if cls._instance is None:
+                cls._instance = cls(region)
+            return cls._instance
 
     @staticmethod
     def default_auth():
@@ -40,17 +56,62 @@ class GoogleEmbedding:
         except Exception as err:
             raise RuntimeError(f"error connecting to GCP: {err}")
 
-    @staticmethod
+    def initialize(self):
+        if self._model is not None:
+            return
+        with self._lock:
+            if self._model is not None:
+                return
+            socket.setdefaulttimeout(120)
+            self.credentials, self.gcp_project, self.gcp_account_email = self.default_auth()
+            vertexai.init(project=self.gcp_project, location=self.gcp_region, credentials=self.credentials)
+            self._model = MultiModalEmbeddingModel.from_pretrained(EMBEDDING_MODEL)
+            logger.debug(f"initialized {EMBEDDING_MODEL} for project {self.gcp_project} in {self.gcp_region}")
+
+    def refresh_credentials(self):
+        if self.credentials.valid:
+            return
+        with self._lock:
+            if not self.credentials.valid:
+                logger.debug("refreshing GCP credentials")
+                self.credentials.refresh(google.auth.transport.requests.Request())
+
+    @property
+    def model(self) -> MultiModalEmbeddingModel:
+        self.initialize()
+        self.refresh_credentials()
+        return self._model
+
+    def get_embeddings(self, **kwargs):
+        model = self.model
+        metrics = Metrics.instance()
+        for retry_number in range(self.max_retries + 1):
+            if self.limiter:
+                self.limiter.acquire()
+            try:
+                with metrics.timer('embedding.request'):
+                    embeddings = model.get_embeddings(**kwargs)
+            except ResourceExhausted:
+                metrics.increment('embedding.throttled')
+                if not self.limiter or retry_number == self.max_retries:
+                    raise
+                logger.debug(f"embedding request throttled, will retry, number {retry_number + 1}")
+                self.limiter.throttled()
+                continue
+            if self.limiter:
+                self.limiter.success()
+            return embeddings
+
     def get_image_embeddings(
+        self,
         image_bytes: bytes,
         contextual_text: Optional[str] = None,
         dimension: int = 1408,
     ) -> Tuple[Optional[List[float]], Optional[List[float]]]:
 
-        model = MultiModalEmbeddingModel.from_pretrained("multimodalembedding")
         image = Image(image_bytes=image_bytes)
 
-        embeddings = model.get_embeddings(
+        embeddings = self.get_embeddings(
             image=image,
             contextual_text=contextual_text,
             dimension=dimension,
@@ -58,15 +119,81 @@ class GoogleEmbedding:
 
         return embeddings.image_embedding, embeddings.text_embedding
 
-    @staticmethod
-    def get_text_embeddings(contextual_text: str, dimension: int = 1408) -> List[float]:
-
-        model = MultiModalEmbeddingModel.from_pretrained("multimodalembedding")
+    def get_text_embeddings(self, contextual_text: str, dimension: int = 1408) -> List[float]:
 
-        embeddings = model.get_embeddings(
+        embeddings = self.get_embeddings(
             image=None,
             contextual_text=contextual_text,
             dimension=dimension,
         )
 
         return embeddings.text_embedding
+
+    def embed(self, item: Union[str, bytes, tuple, dict], dimension: int = 1408):
+        if isinstance(item, str):
+            return self.get_text_embeddings(item, dimension)
+        elif isinstance(item, bytes):
+            return self.get_image_embeddings(item, None, dimension)
+        elif isinstance(item, tuple):
+            image_bytes, contextual_text = item
+            return self.get_image_embeddings(image_bytes, contextual_text, dimension)
+        elif isinstance(item, dict):
+            if item.get('image_bytes') is None:
+                return self.get_text_embeddings(item['text'], dimension)
+            return self.get_image_embeddings(item['image_bytes'], item.get('text'), dimension)
+        raise TypeError(f"unsupported embedding item type {type(item).__name__}")
+
+    def _embed_safe(self, item, dimension: int):
+        try:
+            return self.embed(item, dimension)
+        except Exception as err:
+            logger.debug(f"embedding failed: {err}")
+            return err
+
+    def embed_many(self, items: Iterable, dimension: int = 1408, concurrency: int = 8) -> List[Any]:
+        self.initialize()
+        with concurrent.futures.ThreadPoolExecutor(max_workers=concurrency) as executor:
+            return list(executor.map(lambda item: self._embed_safe(item, dimension), items))
+
+    async def aembed(self, item: Union[str, bytes, tuple, dict], dimension: int = 1408):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, self.embed, item, dimension)
+
+    async def aembed_many(self, items: Iterable, dimension: int = 1408, concurrency: int = 8) -> List[Any]:
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def embed_one(item):
+            async with semaphore:
+                return await self.aembed(item, dimension)
+
+        return await asyncio.gather(*[embed_one(item) for item in items], return_exceptions=True)
+
+
+class GoogleEmbedding:
+
+    def __init__(self, region: str = 'us-central1'):
+        self.client = EmbeddingClient.instance(region)
+
+    @staticmethod
+    def get_image_embeddings(
+        image_bytes: bytes,
+        contextual_text: Optional[str] = None,
+        dimension: int = 1408,
+    ) -> Tuple[Optional[List[float]], Optional[List[float]]]:
+        return EmbeddingClient.instance().get_image_embeddings(image_bytes, contextual_text, dimension)
+
+    @staticmethod
+    def get_text_embeddings(contextual_text: str, dimension: int = 1408) -> List[float]:
+        return EmbeddingClient.instance().get_text_embeddings(contextual_text, dimension)
+
+    @staticmethod
+    def embed_many(items: Iterable, dimension: int = 1408, concurrency: int = 8) -> List[Any]:
+        return EmbeddingClient.instance().embed_many(items, dimension, concurrency)
+
+    @staticmethod
+    async def aembed(item: Union[str, bytes, tuple, dict], dimension: int = 1408):
+        return await EmbeddingClient.instance().aembed(item, dimension)
+
+    @staticmethod
+    async def aembed_many(items: Iterable, dimension: int = 1408, concurrency: int = 8) -> List[Any]:
+        return await EmbeddingClient.instance().aembed_many(items, dimension, concurrency)
@@ -3,81 +3,47 @@
 
 from typing import Optional, Tuple, List
 from cbcmgr.cb_transform import Transform
-from moviedemo.restmgr import RESTManager
-import socket
-import google.auth
-import vertexai
-from vertexai.vision_models import (
-    Image,
-    MultiModalEmbeddingModel
-)
+from moviedemo.image_cache import ImageCache
+from moviedemo.embedding_store import EmbeddingStore
+from moviedemo.google_embedding import EmbeddingClient, EMBEDDING_MODEL
+from moviedemo.manifest import fingerprint
+from moviedemo.storage_profile import StorageProfile
 
 
 class GoogleEmbedding(Transform):
 
-    def __init__(self, *args, region: str = 'us-central1', **kwargs):
+    def __init__(self, *args, region: str = 'us-central1', image_bytes: Optional[bytes] = None, profile: Optional[StorageProfile] = None, **kwargs):
         super().__init__(*args, **kwargs)
-        self.gcp_account = None
-        self.gcp_project = None
-        self.gcp_region = region
-        self.gcp_account_file = None
-        self.gcp_account_email = None
-        self.gcp_zone_list = []
-        self.gcp_zone = None
-
-        socket.setdefaulttimeout(120)
-
-        self.credentials, self.gcp_project, self.gcp_account_email = self.default_auth()
-
-        vertexai.init(project=self.gcp_project, location=self.gcp_region, credentials=self.credentials)
-
-    @staticmethod
-    def default_auth():
-        try:
-            credentials, project_id = google.auth.default()
-            if hasattr(credentials, "service_account_email"):
-                account_email = credentials.service_account_email
-            else:
-                account_email = credentials.signer_email
-            return credentials, project_id, account_email
-        except Exception as err:
-            raise RuntimeError(f"error connecting to GCP: {err}")
+        self.image_bytes = image_bytes
+        self.profile = profile if profile else StorageProfile()
+        self.client = EmbeddingClient.instance(region)
 
     @staticmethod
     def get_text_embeddings(contextual_text: str, dimension: int = 1408) -> List[float]:
-
-        model = MultiModalEmbeddingModel.from_pretrained("multimodalembedding")
-
-        embeddings = model.get_embeddings(
-            image=None,
-            contextual_text=contextual_text,
-            dimension=dimension,
-        )
-
-        return embeddings.text_embedding
+        return EmbeddingClient.instance().get_text_embeddings(contextual_text, dimension)
 
     @staticmethod
     def get_image_embeddings(image_bytes: bytes, contextual_text: Optional[str] = None, dimension: int = 1408) -> Tuple[Optional[List[float]], Optional[List[float]]]:
-        model = MultiModalEmbeddingModel.from_pretrained("multimodalembedding")
-        image = Image(image_bytes=image_bytes)
-
-        embeddings = model.get_embeddings(
-            image=image,
-            contextual_text=contextual_text,
-            dimension=dimension,
-        )
-
-        return embeddings.image_embedding, embeddings.text_embedding
+        return EmbeddingClient.instance().get_image_embeddings(image_bytes, contextual_text, dimension)
 
     def transform(self, source: dict) -> Tuple[str, dict]:
         poster_url = source['poster_path']
         movie_overview = source['overview']
         record_id = str(source['id'])
-        image_bytes = RESTManager().get_url_content(poster_url)
+        image_bytes = self.image_bytes
+        if image_bytes is None:
+            image_bytes = ImageCache.instance().get(poster_url)
 
-        image_embedding, text_embedding = self.get_image_embeddings(image_bytes, movie_overview)
+        embedding_model = EMBEDDING_MODEL
+        store = EmbeddingStore.instance()
+        key = store.make_key(embedding_model, self.profile.dimension, image_bytes, movie_overview)
 
-        embedding_model = "multimodalembedding"
+        cached = store.get(key)
+        if cached:
+            image_embedding, text_embedding = cached
+        else:
+            image_embedding, text_embedding = self.get_image_embeddings(image_bytes, movie_overview, self.profile.dimension)
+            store.put(key, image_embedding, text_embedding)
 
         document = dict(
             title=source.get('title'),
@@ -87,9 +53,12 @@ class GoogleEmbedding(Transform):
             overview=source.get('overview'),
             poster_path=source.get('poster_path'),
             backdrop_path=source.get('backdrop_path'),
+            fingerprint=fingerprint(source, model=embedding_model, **self.profile.settings),
             embedding_model=embedding_model,
-            image_embedding=image_embedding,
-            text_embedding=text_embedding
+            embedding_dimension=self.profile.dimension,
+            embedding_encoding=self.profile.encoding,
+            image_embedding=self.profile.encode(image_embedding),
+            text_embedding=self.profile.encode(text_embedding)
         )
 
         return record_id, document
@@ -0,0 +1,172 @@
+##
+##
+
+import os
+import json
+import hashlib
+import logging
+import tempfile
+import threading
+from pathlib import Path
+from typing import Union
+from moviedemo.restmgr import RESTManager
+from moviedemo.metrics import Metrics
+
+logger = logging.getLogger('moviedemo.image_cache')
+logger.addHandler(logging.NullHandler())
+DEFAULT_CACHE_DIR = os.path.join(Path.home(), '.moviedemo', 'images')
+DEFAULT_CACHE_SIZE = 4096
+
+
+class ImageCache(object):
+    _instance = None
+    _instance_lock = threading.Lock()
+
+    def __init__(self, cache_dir: Union[str, None] = None, max_size_mb: int = DEFAULT_CACHE_SIZE, revalidate: bool = False):
+        self.cache_dir = cache_dir if cache_dir else DEFAULT_CACHE_DIR
+        self.max_size = max_size_mb * 1024 * 1024
+        self.revalidate = revalidate
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+        os.makedirs(self.cache_dir, exist_ok=True)
+        self._total_size = sum(os.path.getsize(f) for f in self._data_files())
+
+    @classmethod
+    def configure(cls, *args, **kwargs):
+        with cls._instance_lock:
+            cls._instance = cls(*args, **kwargs)
+            return cls._instance
+
+    @classmethod
+    def instance(cls):
+        with cls._instance_lock:
+            if cls._instance is None:
+                cls._instance = cls()
+            return cls._instance
+
+    @staticmethod
+    def url_key(url: str) -> str:
+        return hashlib.sha256(url.encode('utf-8')).hexdigest()
+
+    @property
+    def rest(self) -> RESTManager:
+        if not hasattr(self._local, 'rest'):
+            self._local.rest = RESTManager()
+        return self._local.rest
+
+    def data_path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, f"{key}.bin")
+
+    def meta_path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, f"{key}.json")
+
+    def _data_files(self):
+        return [os.path.join(self.cache_dir, f) for f in os.listdir(self.cache_dir) if f.endswith('.bin')]
+
+    def get(self, url: str) -> bytes:
+        key = self.url_key(url)
+        content = self._read(key)
+
+        if content is not None and not self.revalidate:
+            self.hits += 1
+            return content
+
+        headers = {}
+        if content is not None:
+            meta = self._read_meta(key)
+            if meta.get('etag'):
+                headers['If-None-Match'] = meta['etag']
+            if meta.get('last_modified'):
+                headers['If-Modified-Since'] = meta['last_modified']
+
+        metrics = Metrics.instance()
+        with metrics.timer('image.download'):
+            response = self.rest.get_url_response(url, headers=headers)
+        metrics.increment('image.downloads')
+        metrics.increment('image.bytes_downloaded', len(response.content))
+
+        if response.status_code == 304 and content is not None:
+            self.hits += 1
+            return content
+
+        self.misses += 1
+        if response.status_code == 200:
+            meta = dict(
+                url=url,
+                etag=response.headers.get('ETag'),
+                last_modified=response.headers.get('Last-Modified'),
+                sha256=hashlib.sha256(response.content).hexdigest()
+            )
+            self._write(key, response.content, meta)
+
+        return response.content
+
+    def _read(self, key: str) -> Union[bytes, None]:
+        path = self.data_path(key)
+        try:
+            with open(path, 'rb') as data_file:
+                content = data_file.read()
+            os.utime(path)
+            return content
+        except FileNotFoundError:
+            return None
+
+    def _read_meta(self, key: str) -> dict:
+        try:
+            with open(self.meta_path(key), 'r') as meta_file:
+                return json.load(meta_file)
+        except (FileNotFoundError, json.decoder.JSONDecodeError):
+            return {}
+
+    def _atomic_write(self, path: str, content: bytes):
+        fd, temp_path = tempfile.mkstemp(dir=self.cache_dir, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as temp_file:
+                temp_file.write(content)
+            os.replace(temp_path, path)
+        except Exception:
+            os.unlink(temp_path)
+            raise
+
+    def _write(self, key: str, content: bytes, meta: dict):
+        path = self.data_path(key)
+        with self._lock:
+            try:
+                previous = os.path.getsize(path)
+            except FileNotFoundError:
+                previous = 0
+            try:
+                self._atomic_write(path, content)
+                self._atomic_write(self.meta_path(key), json.dumps(meta).encode('utf-8'))
+            except OSError as err:
+                logger.warning(f"can not write cache entry for {meta.get('url')}: {err}")
+                return
+            self._total_size += len(content) - previous
+            if self._total_size > self.max_size:
+                self._evict()
+
+    def _evict(self):
+        entries = []
+        for path in self._data_files():
+            try:
+                entries.append((os.path.getmtime(path), os.path.getsize(path), path))
+            except FileNotFoundError:
+                continue
+        entries.sort()
+        target = self.max_size * 0.9
+        for _, size, path in entries:
+            if self._total_size <= target:
+                break
+            try:
+                os.unlink(path)
+            except FileNotFoundError:
+                continue
+            try:
+                os.unlink(path[:-len('.bin')] + '.json')
+            except FileNotFoundError:
+                pass
+            self._total_size -= size
+            logger.debug(f"evicted {path} from image cache")
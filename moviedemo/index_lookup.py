@@ -1,8 +1,11 @@
 #!/usr/bin/env python3
 
 import argparse
-from moviedemo.google_embedding import GoogleEmbedding
 from cbcmgr.cb_operation_s import CBOperation
+from moviedemo.search import CouchbaseSearch, LocalSearch
+from moviedemo.storage_profile import DIMENSIONS
+from moviedemo.embedding_store import EmbeddingStore
+from moviedemo.cache import QueryEmbeddingCache
 
 
 def main():
@@ -13,17 +16,26 @@ def main():
     parser.add_argument('-b', '--bucket', action='store', help="Bucket", default="movies")
     parser.add_argument('-s', '--scope', action='store', help="Scope", default="data")
     parser.add_argument('-c', '--collection', action='store', help="Collection", default="data")
+    parser.add_argument('-L', '--local', action='store', help="Search Documents in a Local File Instead of the Cluster")
+    parser.add_argument('-k', action='store', help="Number of Results", type=int, default=2)
+    parser.add_argument('--dimension', action='store', help="Embedding Dimension", type=int, choices=DIMENSIONS, default=1408)
+    parser.add_argument('--query-cache-dir', action='store', help="Persistent Query Embedding Cache Directory")
     options = parser.parse_args()
 
     question = input("What movie would you like to watch? ")
 
-    vector = GoogleEmbedding().get_text_embeddings(question)
+    store = EmbeddingStore(options.query_cache_dir) if options.query_cache_dir else None
+    vector = QueryEmbeddingCache(store=store).get_text_embeddings(question, options.dimension)
 
-    keyspace = f"{options.bucket}.{options.scope}.{options.collection}"
-    op = CBOperation(options.host, options.user, options.password, ssl=True, quota=1024, create=True, replicas=0)
-    op.connect(keyspace)
+    if options.local:
+        backend = LocalSearch.from_file(options.local)
+    else:
+        keyspace = f"{options.bucket}.{options.scope}.{options.collection}"
+        op = CBOperation(options.host, options.user, options.password, ssl=True, quota=1024, create=True, replicas=0)
+        op.connect(keyspace)
+        backend = CouchbaseSearch(op)
 
-    results = op.vector_search('movie_vector', 'image_embedding', vector)
+    results = backend.search(vector, 'image_embedding', options.k)
     for result in results:
         print(result.get('title'))
 
@@ -0,0 +1,63 @@
+##
+##
+
+import os
+import json
+import hashlib
+import logging
+import tempfile
+import threading
+from typing import Union
+
+logger = logging.getLogger('moviedemo.manifest')
+logger.addHandler(logging.NullHandler())
+FINGERPRINT_FIELDS = ('title', 'release_date', 'popularity', 'imdb_id', 'overview', 'poster_path', 'backdrop_path')
+
+
+def fingerprint(record: dict, **settings) -> str:
+    content = {field: record.get(field) for field in FINGERPRINT_FIELDS}
+    content.update(settings)
+    return hashlib.sha256(json.dumps(content, sort_keys=True).encode('utf-8')).hexdigest()
+
+
+class Manifest(object):
+
+    def __init__(self, file_name: str):
+        self.file_name = file_name
+        self.entries = {}
+        self._lock = threading.Lock()
+        self.read()
+
+    def read(self):
+        try:
+            with open(self.file_name, 'r') as manifest_file:
+                self.entries = json.load(manifest_file)
+        except FileNotFoundError:
+            self.entries = {}
+        logger.debug(f"manifest {self.file_name} has {len(self.entries)} records")
+
+    def save(self):
+        directory = os.path.dirname(os.path.abspath(self.file_name))
+        with self._lock:
+            fd, temp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+            try:
+                with os.fdopen(fd, 'w') as temp_file:
+                    json.dump(self.entries, temp_file)
+                os.replace(temp_path, self.file_name)
+            except Exception:
+                os.unlink(temp_path)
+                raise
+
+    def get(self, record_id) -> Union[str, None]:
+        return self.entries.get(str(record_id))
+
+    def update(self, record_id, value: str):
+        with self._lock:
+            self.entries[str(record_id)] = value
+
+    def remove(self, record_id):
+        with self._lock:
+            self.entries.pop(str(record_id), None)
+
+    def ids(self) -> set:
+        return set(self.entries.keys())
@@ -0,0 +1,218 @@
+##
+##
+
+import os
+import json
+import time
+import bisect
+import logging
+import tempfile
+import threading
+from contextlib import contextmanager
+from typing import Callable, Sequence, Union
+
+logger = logging.getLogger('moviedemo.metrics')
+logger.addHandler(logging.NullHandler())
+DEFAULT_BUCKETS = tuple(0.001 * 2 ** n for n in range(16))
+
+
+def label_value(value) -> str:
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def metric_key(name: str, labels: dict) -> str:
+    if not labels:
+        return name
+    values = ','.join(f'{label}="{label_value(value)}"' for label, value in sorted(labels.items()))
+    return f"{name}{{{values}}}"
+
+
+def split_key(key: str) -> tuple:
+    name, _, labels = key.partition('{')
+    return name, labels[:-1]
+
+
+class Histogram(object):
+
+    def __init__(self, buckets: Sequence[float] = DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            self.counts[index] += 1
+            self.count += 1
+            self.total += value
+            if value > self.max:
+                self.max = value
+
+    def snapshot(self) -> tuple:
+        with self._lock:
+            return list(self.counts), self.count, self.total
+
+    def quantile(self, q: float) -> Union[float, None]:
+        if not self.count:
+            return None
+        rank = q * self.count
+        cumulative = 0
+        for index, count in enumerate(self.counts):
+            if count and cumulative + count >= rank:
+                lower = self.buckets[index - 1] if index > 0 else 0.0
+                upper = min(self.buckets[index], self.max) if index < len(self.buckets) else self.max
+                return lower + (max(upper, lower) - lower) * ((rank - cumulative) / count)
+            cumulative += count
+        return self.max
+
+    def summary(self) -> dict:
+        def ms(value):
+            return round(value * 1000.0, 3) if value is not None else None
+        return dict(count=self.count,
+                    total_seconds=round(self.total, 3),
+                    mean_ms=ms(self.total / self.count) if self.count else None,
+                    p50_ms=ms(self.quantile(0.5)),
+                    p95_ms=ms(self.quantile(0.95)),
+                    p99_ms=ms(self.quantile(0.99)),
+                    max_ms=ms(self.max) if self.count else None)
+
+
+class Metrics(object):
+    _instance = None
+    _instance_lock = threading.Lock()
+
+    def __init__(self, enabled: bool = True):
+        self.enabled = enabled
+        self.histograms = {}
+        self.counters = {}
+        self.gauges = {}
+        self.gauge_functions = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def configure(cls, *args, **kwargs):
+        with cls._instance_lock:
+            cls._instance = cls(*args, **kwargs)
+            return cls._instance
+
+    @classmethod
+    def instance(cls):
+        with cls._instance_lock:
+            if cls._instance is None:
+                cls._instance = cls(enabled=False)
+            return cls._instance
+
+    def histogram(self, name: str, **labels) -> Histogram:
+        key = metric_key(name, labels)
+        histogram = self.histograms.get(key)
+        if histogram is None:
+            with self._lock:
+                histogram = self.histograms.setdefault(key, Histogram())
+        return histogram
+
+    def observe(self, name: str, seconds: float, **labels):
+        if self.enabled:
+            self.histogram(name, **labels).observe(seconds)
+
+    def increment(self, name: str, amount: float = 1, **labels):
+        if not self.enabled:
+            return
+        key = metric_key(name, labels)
+        with self._lock:
+            self.counters[key] = self.counters.get(key, 0) + amount
+
+    def add_gauge(self, name: str, amount: float, **labels):
+        if not self.enabled:
+            return
+        key = metric_key(name, labels)
+        with self._lock:
+            self.gauges[key] = self.gauges.get(key, 0) + amount
+
+    def register_gauge(self, name: str, func: Callable[[], float], **labels):
+        with self._lock:
+            self.gauge_functions[metric_key(name, labels)] = func
+
+    @contextmanager
+    def timer(self, name: str, **labels):
+        if not self.enabled:
+            yield
+            return
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start, **labels)
+
+    def gauge_values(self) -> dict:
+        with self._lock:
+            values = dict(self.gauges)
+        for key, func in list(self.gauge_functions.items()):
+            try:
+                values[key] = float(func())
+            except Exception as err:
+                logger.debug(f"gauge {key} failed: {err}")
+        return values
+
+    def summary(self) -> dict:
+        with self._lock:
+            counters = dict(self.counters)
+            histograms = dict(self.histograms)
+        summary = dict(timers={name: histogram.summary() for name, histogram in sorted(histograms.items())},
+                       counters=dict(sorted(counters.items())))
+        gauges = self.gauge_values()
+        if gauges:
+            summary['gauges'] = dict(sorted(gauges.items()))
+        return summary
+
+    def prometheus(self, prefix: str = 'moviedemo') -> str:
+        lines = []
+        declared = set()
+
+        def metric_name(key: str, suffix: str, kind: str) -> tuple:
+            name, labels = split_key(key)
+            name = f"{prefix}_{name.replace('.', '_')}{suffix}"
+            if name not in declared:
+                declared.add(name)
+                lines.append(f"# TYPE {name} {kind}")
+            return name, labels
+
+        with self._lock:
+            counters = dict(self.counters)
+            histograms = dict(self.histograms)
+
+        for key, value in sorted(counters.items(), key=lambda item: split_key(item[0])):
+            name, labels = metric_name(key, '_total', 'counter')
+            lines.append(f"{name}{{{labels}}} {value}" if labels else f"{name} {value}")
+
+        for key, value in sorted(self.gauge_values().items(), key=lambda item: split_key(item[0])):
+            name, labels = metric_name(key, '', 'gauge')
+            lines.append(f"{name}{{{labels}}} {value}" if labels else f"{name} {value}")
+
+        for key, histogram in sorted(histograms.items(), key=lambda item: split_key(item[0])):
+            name, labels = metric_name(key, '_seconds', 'histogram')
+            counts, count, total = histogram.snapshot()
+            prefix_labels = f"{labels}," if labels else ''
+            cumulative = 0
+            for bound, bucket_count in zip(histogram.buckets, counts):
+                cumulative += bucket_count
+                lines.append(f'{name}_bucket{{{prefix_labels}le="{bound:g}"}} {cumulative}')
+            lines.append(f'{name}_bucket{{{prefix_labels}le="+Inf"}} {count}')
+            lines.append(f"{name}_sum{{{labels}}} {total}" if labels else f"{name}_sum {total}")
+            lines.append(f"{name}_count{{{labels}}} {count}" if labels else f"{name}_count {count}")
+
+        return '\n'.join(lines) + '\n'
+
+    def save(self, file_name: str, **extra):
+        directory = os.path.dirname(os.path.abspath(file_name))
+        fd, temp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'w') as temp_file:
+                json.dump(dict(extra, **self.summary()), temp_file, indent=2)
+            os.replace(temp_path, file_name)
+        except Exception:
+            os.unlink(temp_path)
+            raise
+        logger.debug(f"wrote metrics summary to {file_name}")
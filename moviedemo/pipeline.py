@@ -0,0 +1,105 @@
+##
+##
+
+import time
+import queue
+import logging
+import threading
+from typing import Callable, Iterable, List, Union
+from moviedemo.metrics import Metrics
+
+logger = logging.getLogger('moviedemo.pipeline')
+logger.addHandler(logging.NullHandler())
+STOP = object()
+
+
+class Stage(object):
+
+    def __init__(self, name: str, func: Callable, workers: int = 1):
+        if workers < 1:
+            raise ValueError(f"stage {name} needs at least one worker")
+        self.name = name
+        self.func = func
+        self.workers = workers
+        self.threads: List[threading.Thread] = []
+
+
+class Pipeline(object):
+
+    def __init__(self, stages: List[Stage], queue_size: int = 16, on_progress: Union[Callable, None] = None, on_error: Union[Callable, None] = None):
+        self.stages = stages
+        self.queues = [queue.Queue(maxsize=queue_size) for _ in stages]
+        self.on_progress = on_progress
+        self.on_error = on_error
+        self.start_time = time.perf_counter()
+        self._completed = 0
+        self._errors = 0
+        self._lock = threading.Lock()
+
+    def worker(self, index: int):
+        stage = self.stages[index]
+        inbound = self.queues[index]
+        outbound = self.queues[index + 1] if index + 1 < len(self.queues) else None
+        metrics = Metrics.instance()
+        while True:
+            waiting = time.perf_counter()
+            item = inbound.get()
+            if item is STOP:
+                break
+            start = time.perf_counter()
+            metrics.observe(f"stage.{stage.name}.wait", start - waiting)
+            try:
+                result = stage.func(item)
+            except Exception as err:
+                metrics.observe(f"stage.{stage.name}", time.perf_counter() - start)
+                metrics.increment(f"stage.{stage.name}.errors")
+                logger.error(f"Stage {stage.name} failed: {err}")
+                if self.on_error:
+                    self.on_error(stage.name, item, err)
+                self.finish(error=True)
+                continue
+            metrics.observe(f"stage.{stage.name}", time.perf_counter() - start)
+            if result is None or outbound is None:
+                self.finish()
+                continue
+            outbound.put(result)
+
+    def finish(self, error: bool = False):
+        with self._lock:
+            self._completed += 1
+            if error:
+                self._errors += 1
+            if self.on_progress:
+                self.on_progress(self)
+
+    def run(self, source: Iterable):
+        self.start_time = time.perf_counter()
+        for index, stage in enumerate(self.stages):
+            for n in range(stage.workers):
+                thread = threading.Thread(target=self.worker, args=(index,), name=f"{stage.name}-{n}", daemon=True)
+                thread.start()
+                stage.threads.append(thread)
+
+        for item in source:
+            self.queues[0].put(item)
+
+        for index, stage in enumerate(self.stages):
+            for _ in stage.threads:
+                self.queues[index].put(STOP)
+            for thread in stage.threads:
+                thread.join()
+
+    @property
+    def completed(self) -> int:
+        return self._completed
+
+    @property
+    def errors(self) -> int:
+        return self._errors
+
+    @property
+    def ops_per_sec(self) -> float:
+        run_duration = time.perf_counter() - self.start_time
+        if run_duration > 0:
+            return self._completed / run_duration
+        return 0.0
@@ -0,0 +1,73 @@
+##
+##
+
+import time
+import asyncio
+import logging
+import threading
+from typing import Union
+
+logger = logging.getLogger('moviedemo.ratelimit')
+logger.addHandler(logging.NullHandler())
+
+
+class RateLimiter(object):
+
+    def __init__(self,
+                 requests_per_minute: float,
+                 burst: int = 1,
+                 min_requests_per_minute: Union[float, None] = None,
+                 increase: float = 0.05,
+                 decrease: float = 0.5):
+        if requests_per_minute <= 0:
+            raise ValueError("requests per minute must be greater than zero")
+        self.max_rate = requests_per_minute / 60.0
+        self.min_rate = (min_requests_per_minute / 60.0) if min_requests_per_minute else self.max_rate / 20.0
+        self.rate = self.max_rate
+        self.capacity = max(1, burst)
+        self.increase = increase
+        self.decrease = decrease
+        self.throttle_count = 0
+        self.wait_time = 0.0
+        self._tokens = float(self.capacity)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _reserve(self) -> float:
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            self._tokens -= 1
+            if self._tokens >= 0:
+                return 0.0
+            wait = -self._tokens / self.rate
+            self.wait_time += wait
+            return wait
+
+    def acquire(self):
+        wait = self._reserve()
+        if wait > 0:
+            time.sleep(wait)
+
+    async def acquire_async(self):
+        wait = self._reserve()
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+    def throttled(self):
+        with self._lock:
+            self.throttle_count += 1
+            self.rate = max(self.min_rate, self.rate * self.decrease)
+            self._tokens = min(self._tokens, 0.0)
+            logger.debug(f"throttled: rate reduced to {self.requests_per_minute:.1f} requests/min")
+
+    def success(self):
+        if self.rate >= self.max_rate:
+            return
+        with self._lock:
+            self.rate = min(self.max_rate, self.rate + self.max_rate * self.increase)
+
+    @property
+    def requests_per_minute(self) -> float:
+        return self.rate * 60.0
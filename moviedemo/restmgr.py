@@ -11,12 +11,14 @@ import warnings
 import base64
 import asyncio
 import ssl
-from typing import Union, List
+from typing import Union, List, Tuple, Callable
 from requests.adapters import HTTPAdapter, Retry
 from requests.auth import AuthBase
 from aiohttp import ClientSession, TCPConnector
 from moviedemo.access_token import AccessToken
-from moviedemo.retry import retry
+from moviedemo.ratelimit import RateLimiter
+from moviedemo.retry import retry, RetryAfter, RetryBudget, parse_retry_after
+from moviedemo.metrics import Metrics
 if os.name == 'nt':
     import certifi_win32
     certifi_where = certifi_win32.wincerts.where()
@@ -28,6 +30,20 @@ logger = logging.getLogger('restmgr')
 logger.addHandler(logging.NullHandler())
 logging.getLogger("urllib3").setLevel(logging.CRITICAL)
 logging.getLogger("asyncio").setLevel(logging.CRITICAL)
+retry_budget = RetryBudget()
+IMAGE_PREFIX = "https://image.tmdb.org/t/p/original"
+
+
+class ClientError(RuntimeError):
+    pass
+
+
+class CountingRetry(Retry):
+
+    def increment(self, *args, **kwargs):
+        new_retry = super().increment(*args, **kwargs)
+        Metrics.instance().increment('http.retries')
+        return new_retry
 
 
 class BearerAuth(AuthBase):
@@ -79,7 +95,14 @@ class RESTManager(object):
                  use_ssl: bool = True,
                  verify: bool = True,
                  port: Union[int, None] = None,
-                 profile: Union[str, None] = None):
+                 profile: Union[str, None] = None,
+                 connection_limit: int = 100,
+                 host_limit: int = 0,
+                 dns_ttl: int = 300,
+                 keepalive: float = 30.0,
+                 max_in_flight: int = 40,
+                 requests_per_second: Union[float, None] = 40.0,
+                 image_prefix: str = IMAGE_PREFIX):
         warnings.filterwarnings("ignore")
         self.hostname = hostname
         self.username = username
@@ -95,6 +118,15 @@ class RESTManager(object):
         self.response_list = []
         self.response_dict = {}
         self.response_code = 200
+        self.connection_limit = connection_limit
+        self.host_limit = host_limit
+        self.dns_ttl = dns_ttl
+        self.keepalive = keepalive
+        self._async_sessions = {}
+        self._async_slots = {}
+        self.max_in_flight = max_in_flight
+        self.image_prefix = image_prefix
+        self.limiter = RateLimiter(requests_per_second * 60, burst=max(1, int(requests_per_second))) if requests_per_second else None
         try:
             self.loop = asyncio.get_event_loop()
         except RuntimeError:
@@ -116,8 +148,8 @@ class RESTManager(object):
         else:
             self.request_headers = {}
         self.session = requests.Session()
-        retries = Retry(total=10,
-                        backoff_factor=0.01)
+        retries = CountingRetry(total=10,
+                                backoff_factor=0.01)
         self.session.mount('http://', HTTPAdapter(max_retries=retries))
         self.session.mount('https://', HTTPAdapter(max_retries=retries))
 
@@ -218,61 +250,160 @@ class RESTManager(object):
     def build_url(self, endpoint: str) -> str:
         return f"{self.url_prefix}{endpoint}"
 
-    @retry()
+    async def get_session(self) -> ClientSession:
+        loop = asyncio.get_running_loop()
+        session = self._async_sessions.get(loop)
+        if session is None or session.closed:
+            conn = TCPConnector(ssl=self.ssl_context if self.verify else False,
+                                limit=self.connection_limit,
+                                limit_per_host=self.host_limit,
+                                ttl_dns_cache=self.dns_ttl,
+                                keepalive_timeout=self.keepalive)
+            session = ClientSession(headers=self.request_headers, connector=conn)
+            self._async_sessions[loop] = session
+        return session
+
+    def request_slot(self) -> asyncio.Semaphore:
+        loop = asyncio.get_running_loop()
+        semaphore = self._async_slots.get(loop)
+        if semaphore is None:
+            semaphore = asyncio.Semaphore(self.max_in_flight)
+            self._async_slots[loop] = semaphore
+        return semaphore
+
+    async def close_async(self):
+        session = self._async_sessions.pop(asyncio.get_running_loop(), None)
+        if session and not session.closed:
+            await session.close()
+
+    def close(self):
+        for loop, session in list(self._async_sessions.items()):
+            if not session.closed and not loop.is_closed() and not loop.is_running():
+                loop.run_until_complete(session.close())
+        self._async_sessions.clear()
+        self._async_slots.clear()
+        self.session.close()
+
+    async def check_async_response(self, response):
+        if response.status == 429:
+            if self.limiter:
+                self.limiter.throttled()
+            raise RetryAfter("Too many requests", parse_retry_after(response.headers.get('Retry-After')))
+        if response.status >= 400:
+            message = f"{response.url}: HTTP {response.status}: {await response.text()}"
+            if response.status < 500:
+                raise ClientError(message)
+            raise RuntimeError(message)
+        if self.limiter:
+            self.limiter.success()
+
+    @retry(factor=0.1, budget=retry_budget, always_raise_list=(ClientError,))
     async def get_async(self, url: str):
-        conn = TCPConnector(ssl_context=self.ssl_context)
-        async with ClientSession(headers=self.request_headers, connector=conn) as session:
-            async with session.get(url, verify_ssl=self.verify) as response:
-                if response.status == 429:
-                    raise RuntimeError("Too many requests")
+        session = await self.get_session()
+        async with self.request_slot():
+            if self.limiter:
+                await self.limiter.acquire_async()
+            async with session.get(url) as response:
+                await self.check_async_response(response)
                 response = await response.json()
                 return response.get('results', [])
 
-    @retry()
+    @retry(factor=0.1, budget=retry_budget, always_raise_list=(ClientError,))
     async def get_async_dict(self, url: str):
-        conn = TCPConnector(ssl_context=self.ssl_context)
-        async with ClientSession(headers=self.request_headers, connector=conn) as session:
-            async with session.get(url, verify_ssl=self.verify) as response:
-                if response.status == 429:
-                    raise RuntimeError("Too many requests")
+        session = await self.get_session()
+        async with self.request_slot():
+            if self.limiter:
+                await self.limiter.acquire_async()
+            async with session.get(url) as response:
+                await self.check_async_response(response)
                 response = await response.json()
                 return response
 
-    async def get_tmdb_a(self, endpoint: str):
-        data = []
+    async def get_tmdb_pages_a(self, endpoint: str) -> List[dict]:
         url = self.page_url(endpoint, 1)
         logger.debug(f"Get {url}")
-        cursor = self.get(url).validate().json()
+        cursor = await self.get_async_dict(url)
 
         total_pages = cursor.get('total_pages', 0)
         logger.debug(f"Total pages: {total_pages}")
 
-        for result in asyncio.as_completed([self.get_async(self.page_url(endpoint, page)) for page in range(1, total_pages + 1)]):
+        data = list(cursor.get('results', []))
+        for result in asyncio.as_completed([self.get_async(self.page_url(endpoint, page)) for page in range(2, total_pages + 1)]):
             block = await result
             data.extend(block)
 
-        self.response_list = data
+        return data
 
-    async def get_tmdb_details_a(self, movies: List[dict]):
+    async def get_tmdb_a(self, endpoint: str):
+        self.response_list = await self.get_tmdb_pages_a(endpoint)
+
+    def tmdb_detail_record(self, block: dict) -> Union[dict, None]:
+        if block['imdb_id'] is None or block['poster_path'] is None:
+            return None
+        poster_part = block['poster_path']
+        backdrop_part = block['backdrop_path']
+        block['poster_path'] = f"{self.image_prefix}{poster_part}"
+        block['backdrop_path'] = f"{self.image_prefix}{backdrop_part}"
+        return block
+
+    async def get_tmdb_detail_list_a(self, movies: List[dict]) -> List[dict]:
         data = []
-        for i in range(0, len(movies), 100):
-            sub_list = movies[i:i + 100]
-            url_list = []
-            for movie in sub_list:
-                movie_id = movie.get('id')
-                endpoint = f"/3/movie/{movie_id}"
-                url = self.build_url(endpoint)
-                url_list.append(url)
-            for result in asyncio.as_completed([self.get_async_dict(url) for url in url_list]):
-                block = await result
-                if block['imdb_id'] is None or block['poster_path'] is None:
-                    continue
-                poster_part = block['poster_path']
-                backdrop_part = block['backdrop_path']
-                block['poster_path'] = f"https://image.tmdb.org/t/p/original{poster_part}"
-                block['backdrop_path'] = f"https://image.tmdb.org/t/p/original{backdrop_part}"
-                data.append(block)
-        self.response_list = data
+        pending = asyncio.Queue()
+        for movie in movies:
+            pending.put_nowait(movie.get('id'))
+
+        async def worker():
+            while True:
+                try:
+                    movie_id = pending.get_nowait()
+                except asyncio.QueueEmpty:
+                    return
+                block = await self.get_async_dict(self.build_url(f"/3/movie/{movie_id}"))
+                record = self.tmdb_detail_record(block)
+                if record:
+                    data.append(record)
+
+        await asyncio.gather(*[worker() for _ in range(min(self.max_in_flight, len(movies)))])
+        return data
+
+    async def get_tmdb_details_a(self, movies: List[dict]):
+        self.response_list = await self.get_tmdb_detail_list_a(movies)
+
+    @staticmethod
+    def tmdb_month_endpoint(year: int, month: int) -> str:
+        _, last = calendar.monthrange(year, month)
+        begin = datetime.datetime(year=year, month=month, day=1)
+        begin_string = begin.strftime("%Y-%m-%d")
+        end = datetime.datetime(year=year, month=month, day=last)
+        end_string = end.strftime("%Y-%m-%d")
+
+        return (f"/3/discover/movie?include_adult=false&include_video=false&language=en-US&sort_by=primary_release_date.asc&primary_release_year={year}"
+                f"&with_original_language=en&primary_release_date.gte={begin_string}&primary_release_date.lte={end_string}")
+
+    async def get_tmdb_month_a(self, year: int, month: int) -> Tuple[int, int, List[dict]]:
+        logger.info(f"Processing month {calendar.month_name[month]} {year}")
+        result = await self.get_tmdb_pages_a(self.tmdb_month_endpoint(year, month))
+        movies = await self.get_tmdb_detail_list_a(result)
+        logger.info(f"{calendar.month_name[month]} {year} has {len(movies)} records")
+        return year, month, movies
+
+    async def get_tmdb_years_a(self, years: List[int], callback: Callable[[int, int, List[dict]], None], months: int = 3):
+        open_months = asyncio.Semaphore(max(1, months))
+
+        async def get_month(year: int, month: int):
+            async with open_months:
+                return await self.get_tmdb_month_a(year, month)
+
+        tasks = [asyncio.ensure_future(get_month(year, month)) for year in years for month in range(1, 13)]
+        try:
+            for result in asyncio.as_completed(tasks):
+                year, month, movies = await result
+                callback(year, month, movies)
+        except BaseException:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            raise
 
     def get_tmdb(self, endpoint: str):
         self.response_list = []
@@ -286,26 +417,17 @@ class RESTManager(object):
         self.loop.run_until_complete(self.get_tmdb_details_a(movies))
         return self
 
-    def get_tmdb_py_year(self, year: int):
-        year_list = []
-        for month in range(1, 13):
-            logger.info(f"Processing month {calendar.month_name[month]}")
-            _, last = calendar.monthrange(year, month)
-            begin = datetime.datetime(year=year, month=month, day=1)
-            begin_string = begin.strftime("%Y-%m-%d")
-            end = datetime.datetime(year=year, month=month, day=last)
-            end_string = end.strftime("%Y-%m-%d")
-
-            endpoint = (f"/3/discover/movie?include_adult=false&include_video=false&language=en-US&sort_by=primary_release_date.asc&primary_release_year={year}"
-                        f"&with_original_language=en&primary_release_date.gte={begin_string}&primary_release_date.lte={end_string}")
-
-            result = self.get_tmdb(endpoint).list()
-            movies = self.get_tmdb_details(result).list()
-            logger.info(f"{calendar.month_name[month]} has {len(movies)} records")
-
-            year_list.extend(movies)
+    def get_tmdb_years(self, years: List[int], callback: Callable[[int, int, List[dict]], None], months: int = 3):
+        self.loop.run_until_complete(self.get_tmdb_years_a(years, callback, months))
+        return self
 
-        return year_list
+    def get_tmdb_py_year(self, year: int):
+        months = {}
+        self.get_tmdb_years([year], lambda _, month, movies: months.update({month: movies}))
+        return [movie for month in sorted(months) for movie in months[month]]
 
     def get_url_content(self, url) -> bytes:
         return self.session.get(url).content
+
+    def get_url_response(self, url, headers: Union[dict, None] = None) -> requests.Response:
+        return self.session.get(url, headers=headers)
@@ -2,15 +2,67 @@
 ##
 
 import time
+import random
 import asyncio
 import logging
-from typing import Callable
+import datetime
+import threading
+from email.utils import parsedate_to_datetime
+from typing import Callable, Union
 from functools import wraps
+from moviedemo.metrics import Metrics
 
 logger = logging.getLogger('cbutil.retry')
 logger.addHandler(logging.NullHandler())
 
 
+class RetryAfter(RuntimeError):
+
+    def __init__(self, message: str, retry_after: Union[float, None] = None):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class RetryBudget(object):
+
+    def __init__(self, ratio: float = 0.2, min_retries: int = 20, max_tokens: int = 100):
+        self.ratio = ratio
+        self.max_tokens = max(max_tokens, min_retries)
+        self._tokens = float(min_retries)
+        self._lock = threading.Lock()
+
+    def deposit(self):
+        with self._lock:
+            self._tokens = min(self.max_tokens, self._tokens + self.ratio)
+
+    def withdraw(self) -> bool:
+        with self._lock:
+            if self._tokens < 1:
+                return False
+            self._tokens -= 1
+            return True
+
+    @property
+    def tokens(self) -> float:
+        return self._tokens
+
+
+def parse_retry_after(value: Union[str, None]) -> Union[float, None]:
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        when = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if when.tzinfo is None:
+        when = when.replace(tzinfo=datetime.timezone.utc)
+    return max(0.0, (when - datetime.datetime.now(datetime.timezone.utc)).total_seconds())
+
+
 def retry_inline(func, *args, retry_count=10, factor=0.01, **kwargs):
     for retry_number in range(retry_count + 1):
         try:
@@ -28,7 +80,9 @@ def retry_inline(func, *args, retry_count=10, factor=0.01, **kwargs):
 def retry(retry_count=10,
           factor=0.01,
           allow_list=None,
-          always_raise_list=None
+          always_raise_list=None,
+          max_wait=30.0,
+          budget: Union[RetryBudget, None] = None
           ) -> Callable:
 
     def retry_handler(func):
@@ -60,7 +114,10 @@ def retry(retry_count=10,
             async def f_wrapper(*args, **kwargs):
                 for retry_number in range(retry_count + 1):
                     try:
-                        return await func(*args, **kwargs)
+                        result = await func(*args, **kwargs)
+                        if budget:
+                            budget.deposit()
+                        return result
                     except Exception as err:
                         if always_raise_list and isinstance(err, always_raise_list):
                             raise
@@ -72,10 +129,18 @@ def retry(retry_count=10,
                             logger.debug(f"{func.__name__} retry limit exceeded")
                             raise
 
+                        if budget and not isinstance(err, RetryAfter) and not budget.withdraw():
+                            logger.debug(f"{func.__name__} retry budget exhausted")
+                            Metrics.instance().increment('retry.budget_exhausted')
+                            raise
+
                         logger.debug(f"{func.__name__} will retry, number {retry_number + 1}")
-                        wait = factor
-                        wait *= (2 ** (retry_number + 1))
-                        time.sleep(wait)
+                        Metrics.instance().increment('retry.attempts')
+                        wait = random.uniform(0, min(max_wait, factor * (2 ** (retry_number + 1))))
+                        if isinstance(err, RetryAfter) and err.retry_after is not None:
+                            wait = max(wait, err.retry_after)
+                        Metrics.instance().increment('retry.sleep_seconds', wait)
+                        await asyncio.sleep(wait)
 
             return f_wrapper
     return retry_handler
@@ -0,0 +1,169 @@
+##
+##
+
+import os
+import time
+import logging
+from abc import ABC, abstractmethod
+from typing import List, Union, Sequence
+import numpy as np
+import couchbase.search as search
+from couchbase.options import SearchOptions
+from couchbase.vector_search import VectorQuery, VectorSearch
+from cbcmgr.cb_operation_s import CBOperation
+from couchbase.exceptions import DocumentNotFoundException, CollectionNotFoundException
+from moviedemo.datafile import DataFile
+from moviedemo.ann import IVFIndex
+from moviedemo.storage_profile import decode_document
+
+logger = logging.getLogger('moviedemo.search')
+logger.addHandler(logging.NullHandler())
+VECTOR_FIELDS = ('image_embedding', 'text_embedding')
+GENERATION_COLLECTION = 'movie_meta'
+
+
+def generation_collection(op: CBOperation, create: bool = False):
+    try:
+        return op.get_collection(op.bucket, op.scope, GENERATION_COLLECTION)
+    except CollectionNotFoundException:
+        if not create:
+            return None
+    op.create_collection(op.bucket, op.scope, GENERATION_COLLECTION)
+    return op.get_collection(op.bucket, op.scope, GENERATION_COLLECTION)
+
+
+def bump_generation(op: CBOperation) -> int:
+    generation = time.time_ns()
+    op.put_doc(generation_collection(op, create=True), op.get_keyspace, dict(generation=generation))
+    return generation
+
+
+def select_fields(document: dict, fields: Union[Sequence[str], None]) -> dict:
+    if not fields:
+        return document
+    return {key: document.get(key) for key in fields}
+
+
+class SearchBackend(ABC):
+
+    @abstractmethod
+    def search(self, vector: List[float], field: str = 'image_embedding', k: int = 2, fields: Union[Sequence[str], None] = None) -> List[dict]:
+        ...
+
+    def generation(self) -> int:
+        return 0
+
+    def has_field(self, field: str) -> bool:
+        return field in VECTOR_FIELDS
+
+
+class CouchbaseSearch(SearchBackend):
+
+    def __init__(self, op: CBOperation, index: str = 'movie_vector'):
+        self.op = op
+        self.index = index
+        self._generation_collection = None
+
+    def search(self, vector: List[float], field: str = 'image_embedding', k: int = 2, fields: Union[Sequence[str], None] = None) -> List[dict]:
+        search_req = search.SearchRequest.create(search.MatchAllQuery()).with_vector_search(
+            VectorSearch.from_vector_query(VectorQuery(field, vector, num_candidates=k)))
+        search_iter = self.op.scope.search(self.index, search_req, SearchOptions(limit=k))
+        return [select_fields(decode_document(self.op.get_doc(self.op.collection, item.id)), fields) for item in search_iter.rows()]
+
+    def generation(self) -> int:
+        if self._generation_collection is None:
+            self._generation_collection = generation_collection(self.op)
+            if self._generation_collection is None:
+                return 0
+        try:
+            return self.op.get_doc(self._generation_collection, self.op.get_keyspace).get('generation', 0)
+        except DocumentNotFoundException:
+            return 0
+
+
+class LocalSearch(SearchBackend):
+
+    def __init__(self, documents: List[dict], vectors: dict, indexes: Union[dict, None] = None):
+        self.documents = documents
+        self.vectors = vectors
+        self.indexes = indexes if indexes else {}
+
+    @classmethod
+    def from_file(cls, file_name: str, vector_fields: Sequence[str] = VECTOR_FIELDS):
+        documents = []
+        rows = {field: [] for field in vector_fields}
+        drop_fields = set(VECTOR_FIELDS).union(vector_fields)
+        for record in DataFile(file_name):
+            record = decode_document(record)
+            for field in drop_fields:
+                value = record.pop(field, None)
+                if field in rows:
+                    rows[field].append(value)
+            documents.append(record)
+
+        vectors = {}
+        for field, values in rows.items():
+            dimension = next((len(v) for v in values if v), 0)
+            if not dimension:
+                continue
+            matrix = np.zeros((len(values), dimension), dtype=np.float32)
+            for n, value in enumerate(values):
+                if value:
+                    matrix[n] = value
+            vectors[field] = cls.normalize(matrix)
+        logger.info(f"loaded {len(documents)} documents from {file_name}")
+        return cls(documents, vectors)
+
+    @staticmethod
+    def normalize(matrix: np.ndarray) -> np.ndarray:
+        norms = np.linalg.norm(matrix, axis=-1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return np.ascontiguousarray(matrix / norms, dtype=np.float32)
+
+    def build_index(self, field: str = 'image_embedding', nlist: Union[int, None] = None, nprobe: int = 8) -> IVFIndex:
+        matrix = self.vectors.get(field)
+        if matrix is None:
+            raise ValueError(f"no vectors loaded for field {field}")
+        self.indexes[field] = IVFIndex.build(matrix, nlist, nprobe)
+        return self.indexes[field]
+
+    def load_index(self, directory: str, field: str = 'image_embedding', source: Union[str, None] = None) -> IVFIndex:
+        index = IVFIndex.load(directory)
+        index_field = index.metadata.get('field')
+        if index_field and index_field != field:
+            raise ValueError(f"index {directory} was built for field {index_field}, not {field}")
+        index_source = index.metadata.get('source')
+        if source and index_source and os.path.realpath(index_source) != os.path.realpath(source):
+            logger.warning(f"index {directory} was built from {index_source}, not {source}")
+        if len(index) != len(self.documents):
+            raise ValueError(f"index {directory} has {len(index)} vectors but {len(self.documents)} documents are loaded")
+        self.indexes[field] = index
+        return index
+
+    def top_k(self, vector: List[float], field: str, k: int, exact: bool = False):
+        query = self.normalize(np.asarray(vector, dtype=np.float32))
+        if field in self.indexes and not exact:
+            return self.indexes[field].search(query, k)
+        return self.exact_top_k(query, field, k)
+
+    def exact_top_k(self, query: np.ndarray, field: str, k: int):
+        matrix = self.vectors.get(field)
+        if matrix is None:
+            raise ValueError(f"no vectors loaded for field {field}")
+        scores = matrix @ query
+        k = min(k, len(scores))
+        if k <= 0:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+        if k < len(scores):
+            candidates = np.argpartition(-scores, k - 1)[:k]
+        else:
+            candidates = np.arange(len(scores))
+        order = candidates[np.argsort(-scores[candidates])]
+        return order, scores[order]
+
+    def search(self, vector: List[float], field: str = 'image_embedding', k: int = 2, fields: Union[Sequence[str], None] = None) -> List[dict]:
+        order, _ = self.top_k(vector, field, k)
+        return [select_fields(self.documents[n], fields) for n in order]
+
+    def has_field(self, field: str) -> bool:
+        return field in self.vectors or field in self.indexes
@@ -0,0 +1,111 @@
+##
+##
+
+import base64
+import logging
+from typing import List, Union, Any
+import attrs
+import numpy as np
+from cbcmgr.cb_operation_s import CBOperation
+from cbcmgr.cb_search_index import CBSearchIndex
+from couchbase.management.search import SearchIndex
+
+logger = logging.getLogger('moviedemo.storage_profile')
+logger.addHandler(logging.NullHandler())
+DIMENSIONS = (128, 256, 512, 1408)
+ENCODINGS = ('float32', 'float16', 'int8', 'base64')
+INDEX_TYPES = {'float32': 'vector', 'base64': 'vector_base64'}
+VECTOR_FIELDS = ('image_embedding', 'text_embedding')
+
+
+def encode_vector(vector: Union[List[float], None], encoding: str) -> Any:
+    if vector is None or encoding == 'float32':
+        return vector
+    values = np.asarray(vector, dtype=np.float32)
+    if encoding == 'base64':
+        return base64.b64encode(values.astype('<f4').tobytes()).decode('ascii')
+    if encoding == 'float16':
+        return base64.b64encode(values.astype('<f2').tobytes()).decode('ascii')
+    if encoding == 'int8':
+        peak = float(np.max(np.abs(values))) if len(values) else 0.0
+        scale = peak / 127.0 if peak > 0 else 1.0
+        quantized = np.clip(np.rint(values / scale), -127, 127).astype(np.int8)
+        return dict(scale=scale, data=base64.b64encode(quantized.tobytes()).decode('ascii'))
+    raise ValueError(f"unknown vector encoding {encoding}")
+
+
+def decode_vector(value: Any, encoding: Union[str, None] = None) -> Union[List[float], None]:
+    if value is None or isinstance(value, list):
+        return value
+    if isinstance(value, dict):
+        quantized = np.frombuffer(base64.b64decode(value['data']), dtype=np.int8)
+        return (quantized.astype(np.float32) * value['scale']).tolist()
+    data = base64.b64decode(value)
+    if encoding == 'float16':
+        return np.frombuffer(data, dtype='<f2').astype(np.float32).tolist()
+    return np.frombuffer(data, dtype='<f4').tolist()
+
+
+def decode_document(document: dict) -> dict:
+    encoding = document.get('embedding_encoding')
+    if not encoding or encoding == 'float32':
+        return document
+    for field in VECTOR_FIELDS:
+        if field in document:
+            document[field] = decode_vector(document[field], encoding)
+    return document
+
+
+class StorageProfile(object):
+
+    def __init__(self, dimension: int = 1408, encoding: str = 'float32'):
+        if dimension not in DIMENSIONS:
+            raise ValueError(f"dimension must be one of {', '.join(str(d) for d in DIMENSIONS)}")
+        if encoding not in ENCODINGS:
+            raise ValueError(f"encoding must be one of {', '.join(ENCODINGS)}")
+        self.dimension = dimension
+        self.encoding = encoding
+
+    def encode(self, vector: Union[List[float], None]) -> Any:
+        return encode_vector(vector, self.encoding)
+
+    def decode(self, value: Any) -> Union[List[float], None]:
+        return decode_vector(value, self.encoding)
+
+    @property
+    def settings(self) -> dict:
+        return dict(dimension=self.dimension, encoding=self.encoding)
+
+    @property
+    def indexable(self) -> bool:
+        return self.encoding in INDEX_TYPES
+
+    def vector_index(self, op: CBOperation, name: str, field: str, similarity: str = "l2_norm"):
+        if not self.indexable:
+            raise ValueError(f"the search service can not index {self.encoding} vectors")
+        if self.encoding == 'float32':
+            op.vector_index(name, self.dimension, field, similarity)
+            return
+
+        _, scope_name, collection_name = op.get_keyspace.split('.')
+        search_index = CBSearchIndex().create(f"{scope_name}.{collection_name}", self.dimension, field, similarity)
+        parameters = self.set_field_type(attrs.asdict(search_index), field, INDEX_TYPES[self.encoding])
+
+        idx = SearchIndex(name=name,
+                          idx_type='fulltext-index',
+                          source_name=op.bucket.name,
+                          source_type='gocbcore',
+                          params=parameters)
+        op.scope.search_indexes().upsert_index(idx)
+
+    @classmethod
+    def set_field_type(cls, parameters: Any, field: str, field_type: str) -> Any:
+        if isinstance(parameters, dict):
+            if parameters.get('name') == field and parameters.get('type') == 'vector':
+                parameters['type'] = field_type
+            for value in parameters.values():
+                cls.set_field_type(value, field, field_type)
+        elif isinstance(parameters, list):
+            for value in parameters:
+                cls.set_field_type(value, field, field_type)
+        return parameters
@@ -18,6 +18,7 @@ setup(
             'demo_server = moviedemo.demo_server:main',
             'index_lookup = moviedemo.index_lookup:main',
             'generate_source_data = moviedemo.generate_source_data:main',
+            'build_index = moviedemo.build_index:main',
         ]
     },
     package_data={'moviedemo': ['templates/*', 'images/*']},
@@ -36,8 +37,12 @@ setup(
         "python-daemon>=3.0.0",
         "Jinja2>=3.0.0",
         "Flask>=3.0.2",
-        "waitress>=3.0.0"
+        "waitress>=3.0.0",
+        "numpy>=1.24.0"
     ],
+    extras_require={
+        "zstd": ["zstandard>=0.22.0"]
+    },
     author_email='info@unix.us.com',
     description='Vector Search Demo',
     long_description=long_description,
@@ -0,0 +1,45 @@
+##
+##
+
+import numpy as np
+from moviedemo.ann import IVFIndex, perturbed_queries
+
+
+def unit_vectors(count, dimension=32, seed=0):
+    vectors = np.random.default_rng(seed).standard_normal((count, dimension)).astype(np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def test_save_and_load(tmp_path):
+    vectors = unit_vectors(500)
+    index = IVFIndex.build(vectors, nlist=8, nprobe=8)
+    index.save(str(tmp_path), field='image_embedding')
+
+    loaded = IVFIndex.load(str(tmp_path))
+    assert len(loaded) == len(index) == 500
+    assert loaded.nlist == 8
+    assert loaded.nprobe == 8
+    assert loaded.metadata['field'] == 'image_embedding'
+    assert loaded.metadata['dimension'] == 32
+
+    for query in unit_vectors(5, seed=1):
+        ids, scores = index.search(query, 10)
+        loaded_ids, loaded_scores = loaded.search(query, 10)
+        assert np.array_equal(ids, loaded_ids)
+        assert np.allclose(scores, loaded_scores)
+
+
+def test_full_probe_matches_exact_search():
+    vectors = unit_vectors(300)
+    index = IVFIndex.build(vectors, nlist=4)
+    query = unit_vectors(1, seed=2)[0]
+    ids, _ = index.search(query, 5, nprobe=4)
+    assert list(ids) == list(np.argsort(-(vectors @ query))[:5])
+
+
+def test_perturbed_queries_are_not_indexed_rows():
+    vectors = unit_vectors(200)
+    queries = perturbed_queries(vectors, 20)
+    assert queries.shape == (20, 32)
+    assert np.allclose(np.linalg.norm(queries, axis=1), 1.0)
+    assert (queries @ vectors.T).max() < 0.999
@@ -0,0 +1,121 @@
+##
+##
+
+import time
+from moviedemo.cache import LRUCache, QueryEmbeddingCache, ResultCache
+from moviedemo.search import SearchBackend
+from moviedemo.embedding_store import EmbeddingStore
+
+
+class CountingEmbedder(object):
+
+    def __init__(self):
+        self.calls = []
+
+    def __call__(self, text, dimension):
+        self.calls.append((text, dimension))
+        return [float(len(text))] * dimension
+
+
+def test_lru_eviction_order():
+    cache = LRUCache(max_size=2)
+    cache.put('a', 1)
+    cache.put('b', 2)
+    assert cache.get('a') == 1
+    cache.put('c', 3)
+    assert cache.get('b') is None
+    assert cache.get('a') == 1
+    assert cache.get('c') == 3
+    assert len(cache) == 2
+    assert (cache.hits, cache.misses) == (3, 1)
+    assert cache.hit_ratio == 0.75
+
+
+def test_lru_ttl_remove_and_disabled():
+    cache = LRUCache(max_size=4, ttl=0.01)
+    cache.put('a', 1)
+    cache.put('b', 2)
+    cache.remove('b')
+    assert cache.get('b') is None
+    time.sleep(0.02)
+    assert cache.get('a') is None
+    assert len(cache) == 0
+    disabled = LRUCache(max_size=0)
+    disabled.put('a', 1)
+    assert disabled.get('a') is None
+
+
+def test_query_cache_normalizes_questions():
+    embed = CountingEmbedder()
+    cache = QueryEmbeddingCache(max_size=8, embed=embed)
+    first = cache.get_text_embeddings('  Space   Movies ', 8)
+    assert cache.get_text_embeddings('space movies', 8) == first
+    cache.get_text_embeddings('space movies', 16)
+    assert embed.calls == [('space movies', 8), ('space movies', 16)]
+    assert (cache.hits, cache.misses) == (1, 2)
+
+
+def test_query_cache_persistent_tier(tmp_path):
+    store = EmbeddingStore(str(tmp_path))
+    embed = CountingEmbedder()
+    QueryEmbeddingCache(store=store, embed=embed).get_text_embeddings('space movies', 8)
+    cache = QueryEmbeddingCache(store=store, embed=embed)
+    assert cache.get_text_embeddings('Space Movies', 8) == [12.0] * 8
+    assert len(embed.calls) == 1
+    assert cache.store_hits == 1
+    store.close()
+
+
+class CountingBackend(SearchBackend):
+
+    def __init__(self):
+        self.searches = 0
+        self.current = 1
+
+    def search(self, vector, field='image_embedding', k=2, fields=None):
+        self.searches += 1
+        return [dict(rank=n) for n in range(k)]
+
+    def generation(self):
+        return self.current
+
+
+def test_result_cache_keys():
+    backend = CountingBackend()
+    cache = ResultCache(backend, max_size=8, check_interval=0.0)
+    assert cache.search([0.1, 0.2], k=2) == [dict(rank=0), dict(rank=1)]
+    cache.search([0.1, 0.2], k=2)
+    cache.search([0.1, 0.2], k=3)
+    cache.search([0.1, 0.2], 'text_embedding', k=2)
+    cache.search([0.1, 0.2], k=2, fields=['title'])
+    cache.search([0.1, 0.3], k=2)
+    assert backend.searches == 5
+    assert cache.results.hits == 1
+
+
+def test_result_cache_returns_copies():
+    cache = ResultCache(CountingBackend(), check_interval=0.0)
+    cache.search([0.1], k=2).append('extra')
+    assert len(cache.search([0.1], k=2)) == 2
+
+
+def test_result_cache_clears_on_new_generation():
+    backend = CountingBackend()
+    cache = ResultCache(backend, check_interval=0.0)
+    cache.search([0.1], k=2)
+    cache.search([0.1], k=2)
+    backend.current = 2
+    cache.search([0.1], k=2)
+    assert backend.searches == 2
+    assert cache.invalidations == 1
+    assert cache.generation() == 2
+
+
+def test_result_cache_checks_generation_at_interval():
+    backend = CountingBackend()
+    cache = ResultCache(backend, check_interval=60.0)
+    cache.search([0.1], k=2)
+    backend.current = 2
+    cache.search([0.1], k=2)
+    assert backend.searches == 1
+    assert cache.invalidations == 0
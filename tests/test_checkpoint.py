@@ -0,0 +1,52 @@
+##
+##
+
+from moviedemo.checkpoint import Checkpoint
+
+
+def test_done_and_failed_survive_reopen(tmp_path):
+    file_name = str(tmp_path / 'load.checkpoint')
+    checkpoint = Checkpoint(file_name)
+    checkpoint.done(1)
+    checkpoint.fail(2, ValueError('image check failed'))
+    checkpoint.fail('3')
+    checkpoint.close()
+
+    checkpoint = Checkpoint(file_name)
+    assert checkpoint.is_done('1')
+    assert checkpoint.is_failed(2)
+    assert checkpoint.failed == {'2': 'image check failed', '3': None}
+    checkpoint.close()
+
+
+def test_retry_success_clears_failure(tmp_path):
+    file_name = str(tmp_path / 'load.checkpoint')
+    checkpoint = Checkpoint(file_name)
+    checkpoint.fail(1, 'timeout')
+    checkpoint.done(1)
+    assert not checkpoint.is_failed(1)
+    checkpoint.close()
+    checkpoint = Checkpoint(file_name)
+    assert checkpoint.is_done(1)
+    assert not checkpoint.failed
+    checkpoint.close()
+
+
+def test_reset_and_partial_lines(tmp_path):
+    file_name = str(tmp_path / 'load.checkpoint')
+    checkpoint = Checkpoint(file_name)
+    checkpoint.done(1)
+    checkpoint.close()
+    with open(file_name, 'a') as journal:
+        journal.write('{"id": 2, "sta')
+
+    checkpoint = Checkpoint(file_name)
+    assert checkpoint.completed == {'1'}
+    checkpoint.done(3)
+    checkpoint.close()
+    checkpoint = Checkpoint(file_name)
+    assert checkpoint.completed == {'1', '3'}
+    checkpoint.close()
+    checkpoint = Checkpoint(file_name, reset=True)
+    assert not checkpoint.completed
+    checkpoint.close()
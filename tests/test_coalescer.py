@@ -0,0 +1,71 @@
+##
+##
+
+import time
+import threading
+import concurrent.futures
+import pytest
+from moviedemo.coalescer import EmbeddingCoalescer, EmbeddingTimeout
+
+
+class SlowEmbedder(object):
+
+    def __init__(self, delay=0.02):
+        self.delay = delay
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def __call__(self, text, dimension):
+        with self._lock:
+            self.calls += 1
+        time.sleep(self.delay)
+        return [float(len(text))] * dimension
+
+
+def test_concurrent_duplicates_share_one_call():
+    embed = SlowEmbedder()
+    coalescer = EmbeddingCoalescer(max_wait=0.05, max_batch=64, embed=embed)
+    questions = ['space movies', 'war movies', 'space movies', 'space movies'] * 4
+    with concurrent.futures.ThreadPoolExecutor(max_workers=len(questions)) as executor:
+        results = list(executor.map(lambda text: coalescer.embed(text, 4), questions))
+    coalescer.close()
+    assert results == [[float(len(text))] * 4 for text in questions]
+    assert coalescer.requests == len(questions)
+    assert coalescer.calls == embed.calls
+    assert embed.calls < len(questions)
+
+
+def test_batch_size_limit():
+    coalescer = EmbeddingCoalescer(max_wait=0.05, max_batch=2, embed=SlowEmbedder(0.0))
+    futures = [coalescer.submit(f"question {n}", 4) for n in range(6)]
+    assert [len(future.result(timeout=5)) for future in futures] == [4] * 6
+    coalescer.close()
+    assert coalescer.batches >= 3
+
+
+def test_errors_reach_every_waiter():
+    def fail(text, dimension):
+        raise ValueError('quota exceeded')
+    coalescer = EmbeddingCoalescer(max_wait=0.02, embed=fail)
+    futures = [coalescer.submit('space movies') for _ in range(3)]
+    for future in futures:
+        with pytest.raises(ValueError, match='quota'):
+            future.result(timeout=5)
+    coalescer.close()
+
+
+def test_timeout():
+    coalescer = EmbeddingCoalescer(embed=SlowEmbedder(0.5), timeout=0.05)
+    with pytest.raises(EmbeddingTimeout):
+        coalescer.embed('space movies')
+    coalescer.close()
+
+
+def test_embedding_error_timeout_is_not_a_wait_timeout():
+    def fail(text, dimension):
+        raise TimeoutError('socket timed out')
+    coalescer = EmbeddingCoalescer(embed=fail, timeout=5)
+    with pytest.raises(TimeoutError) as raised:
+        coalescer.embed('space movies')
+    assert not isinstance(raised.value, EmbeddingTimeout)
+    coalescer.close()
@@ -0,0 +1,82 @@
+##
+##
+
+import gzip
+import pytest
+from moviedemo.datafile import DataFile, DataWriter, file_compression
+
+RECORDS = [dict(id=n, title=f"Movie {n}", overview="a \"quoted\" [bracketed] {braced} overview") for n in range(200)]
+
+
+def write_records(path, data_format):
+    with DataWriter(str(path), data_format) as writer:
+        writer.write(RECORDS)
+    return str(path)
+
+
+def truncate(path, fraction=0.6):
+    with open(path, 'rb') as data_file:
+        data = data_file.read()
+    with open(path, 'wb') as data_file:
+        data_file.write(data[:int(len(data) * fraction)])
+
+
+@pytest.mark.parametrize('name,data_format', [
+    ('movies.json', 'json'),
+    ('movies.jsonl', 'jsonl'),
+    ('movies.json.gz', 'json'),
+    ('movies.jsonl.gz', 'jsonl'),
+])
+def test_round_trip(tmp_path, name, data_format):
+    file_name = write_records(tmp_path / name, data_format)
+    data = DataFile(file_name, chunk_size=16)
+    assert data.format == data_format
+    assert list(data) == RECORDS
+
+
+def test_compressed_json_total_is_exact(tmp_path):
+    data = DataFile(write_records(tmp_path / 'movies.json.gz', 'json'), chunk_size=64)
+    assert data.total == len(RECORDS)
+    assert not data.estimated
+
+
+def test_compression_detected_from_content(tmp_path):
+    path = tmp_path / 'movies.json'
+    with gzip.open(path, 'wt', encoding='utf-8') as data_file:
+        data_file.write('[{"id": 1}]')
+    assert file_compression(str(path)) == 'gzip'
+    assert list(DataFile(str(path))) == [dict(id=1)]
+    assert file_compression(str(write_records(tmp_path / 'plain.json', 'json'))) is None
+
+
+def test_zstd_detected_from_content(tmp_path):
+    pytest.importorskip('zstandard')
+    file_name = write_records(tmp_path / 'movies.jsonl.zst', 'jsonl')
+    assert file_compression(file_name) == 'zstd'
+    assert list(DataFile(file_name)) == RECORDS
+
+
+def test_unterminated_array(tmp_path, caplog):
+    path = tmp_path / 'movies.json'
+    path.write_text('[{"id": 1}, {"id": 2},\n')
+    assert list(DataFile(str(path), chunk_size=4)) == [dict(id=1), dict(id=2)]
+    assert 'not terminated' in caplog.text
+
+
+@pytest.mark.parametrize('name,data_format', [('movies.json.gz', 'json'), ('movies.jsonl.gz', 'jsonl')])
+def test_truncated_gzip(tmp_path, caplog, name, data_format):
+    file_name = write_records(tmp_path / name, data_format)
+    truncate(file_name)
+    data = DataFile(file_name, chunk_size=256)
+    records = list(data)
+    assert 0 < len(records) < len(RECORDS)
+    assert records == RECORDS[:len(records)]
+    assert data.total == len(records)
+    assert 'truncated' in caplog.text
+
+
+def test_invalid_line(tmp_path):
+    path = tmp_path / 'movies.jsonl'
+    path.write_text('{"id": 1}\n{"id": \n')
+    with pytest.raises(ValueError, match='line 2'):
+        list(DataFile(str(path)))
@@ -0,0 +1,80 @@
+##
+##
+
+import time
+import numpy as np
+import pytest
+import moviedemo.demo_server as demo_server
+from moviedemo.search import LocalSearch
+from moviedemo.cache import QueryEmbeddingCache
+from moviedemo.coalescer import EmbeddingCoalescer
+
+DIMENSION = 8
+
+
+def text_vector(text: str, dimension: int):
+    return np.random.default_rng(len(text)).standard_normal(dimension).tolist()
+
+
+@pytest.fixture
+def client(monkeypatch):
+    rng = np.random.default_rng(0)
+    documents = [dict(title=f"Movie {n}", overview=f"Overview {n}") for n in range(20)]
+    backend = LocalSearch(documents, dict(image_embedding=LocalSearch.normalize(rng.standard_normal((20, DIMENSION)).astype(np.float32))))
+    monkeypatch.setattr(demo_server, 'backend', backend, raising=False)
+    monkeypatch.setattr(demo_server, 'dimension', DIMENSION)
+    QueryEmbeddingCache.configure(16, None, None, text_vector)
+    yield demo_server.app.test_client()
+    QueryEmbeddingCache.configure()
+
+
+def test_search_by_question_and_vector(client):
+    response = client.post('/api/search', json=dict(question='a space movie', k=3, fields=['title']))
+    assert response.status_code == 200
+    assert response.get_json()['count'] == 3
+    assert set(response.get_json()['results'][0]) == {'title'}
+    response = client.post('/api/search', json=dict(vector=[0.5] * DIMENSION))
+    assert response.status_code == 200
+    assert response.get_json()['count'] == 2
+
+
+@pytest.mark.parametrize('body,message', [
+    ([1, 2], 'JSON object'),
+    (dict(question='q', k='many'), 'k must be an integer'),
+    (dict(question='q', k=0), 'k must be between'),
+    (dict(question='q', k=demo_server.MAX_RESULTS + 1), 'k must be between'),
+    (dict(question='q', field='poster'), 'field must be one of'),
+    (dict(question='q', field='text_embedding'), 'not searchable'),
+    (dict(question='q', fields='title'), 'fields must be a list'),
+    (dict(vector=[1.0] * (DIMENSION - 1)), f"list of {DIMENSION} numbers"),
+    (dict(vector=['a'] * DIMENSION), f"list of {DIMENSION} numbers"),
+    (dict(question='  '), 'question or vector is required'),
+    (dict(), 'question or vector is required'),
+])
+def test_invalid_requests(client, body, message):
+    response = client.post('/api/search', json=body)
+    assert response.status_code == 400
+    assert message in response.get_json()['error']
+
+
+def test_embedding_timeout(client):
+    coalescer = EmbeddingCoalescer(embed=lambda text, dimension: time.sleep(0.5), timeout=0.05)
+    QueryEmbeddingCache.configure(16, None, None, coalescer.embed)
+    response = client.post('/api/search', json=dict(question='slow question'))
+    assert response.status_code == 503
+    assert 'embedding service' in response.get_json()['error']
+    response = client.post('/results', data=dict(question='slow question'))
+    assert response.status_code == 503
+    coalescer.close()
+
+
+def test_backend_timeout_is_not_an_embedding_timeout(client, monkeypatch):
+    def timeout(*args, **kwargs):
+        raise TimeoutError('backend timed out')
+    monkeypatch.setattr(demo_server.backend, 'search', timeout)
+    demo_server.app.config['PROPAGATE_EXCEPTIONS'] = False
+    try:
+        response = client.post('/api/search', json=dict(vector=[0.5] * DIMENSION))
+    finally:
+        demo_server.app.config['PROPAGATE_EXCEPTIONS'] = None
+    assert response.status_code == 500
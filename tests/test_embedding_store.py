@@ -0,0 +1,78 @@
+##
+##
+
+from moviedemo.embedding_store import EmbeddingStore
+
+
+def vector(seed, size=4):
+    return [float(seed * 10 + n) for n in range(size)]
+
+
+def test_put_and_get(tmp_path):
+    store = EmbeddingStore(str(tmp_path))
+    key = store.make_key('model', 128, b'image', 'text')
+    assert store.get(key) is None
+    store.put(key, vector(1), vector(2))
+    assert key in store
+    assert store.get(key) == (vector(1), vector(2))
+    assert (store.hits, store.misses) == (1, 1)
+    store.close()
+
+
+def test_image_only_and_empty_entries(tmp_path):
+    store = EmbeddingStore(str(tmp_path))
+    store.put('image', vector(1))
+    store.put('empty', None)
+    assert store.get('image') == (vector(1), None)
+    assert store.get('empty') == (None, None)
+    store.close()
+
+
+def test_keys_differ_by_model_and_dimension():
+    keys = {EmbeddingStore.make_key(model, dimension, b'image', None) for model in ('a', 'b') for dimension in (128, 256)}
+    assert len(keys) == 4
+
+
+def test_reopen(tmp_path):
+    store = EmbeddingStore(str(tmp_path))
+    for n in range(10):
+        store.put(f"k{n}", vector(n), vector(n + 100))
+    store.close()
+    store = EmbeddingStore(str(tmp_path))
+    assert len(store) == 10
+    for n in range(10):
+        assert store.get(f"k{n}") == (vector(n), vector(n + 100))
+    store.close()
+
+
+def test_two_writers(tmp_path):
+    first = EmbeddingStore(str(tmp_path))
+    second = EmbeddingStore(str(tmp_path))
+    first.put('ka', vector(1))
+    second.put('kb', vector(2), vector(3))
+    first.put('kc', vector(4))
+    second.put('kd', vector(5))
+    assert first.get('kc') == (vector(4), None)
+    assert second.get('kb') == (vector(2), vector(3))
+    first.close()
+    second.close()
+
+    store = EmbeddingStore(str(tmp_path))
+    assert store.get('ka') == (vector(1), None)
+    assert store.get('kb') == (vector(2), vector(3))
+    assert store.get('kc') == (vector(4), None)
+    assert store.get('kd') == (vector(5), None)
+    store.close()
+
+
+def test_entries_past_end_of_data_are_ignored(tmp_path):
+    store = EmbeddingStore(str(tmp_path))
+    store.put('ka', vector(1))
+    store.put('kb', vector(2))
+    store.close()
+    with open(store.vector_file, 'r+b') as vector_file:
+        vector_file.truncate(len(vector(1)) * 4 + 2)
+    store = EmbeddingStore(str(tmp_path))
+    assert 'ka' in store
+    assert 'kb' not in store
+    store.close()
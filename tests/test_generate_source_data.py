@@ -0,0 +1,29 @@
+##
+##
+
+import os
+import pytest
+from moviedemo.datafile import DataFile
+from moviedemo.generate_source_data import YearWriter, parse_years
+
+
+def test_parse_years():
+    assert parse_years('2019,2021-2023') == [2019, 2021, 2022, 2023]
+    assert parse_years('2020') == [2020]
+
+
+@pytest.mark.parametrize('data_format', ['json', 'jsonl'])
+def test_complete_and_partial_years(tmp_path, monkeypatch, caplog, data_format):
+    monkeypatch.chdir(tmp_path)
+    writer = YearWriter([2021, 2022], data_format)
+    for month in range(1, 13):
+        writer.add(2021, month, [dict(id=2021 * 100 + month)])
+    for month in range(1, 4):
+        writer.add(2022, month, [dict(id=2022 * 100 + month)])
+    writer.close()
+
+    assert writer.record_count == 15
+    assert len(list(DataFile(writer.output_file(2021)))) == 12
+    assert not os.path.exists(writer.output_file(2022))
+    assert len(list(DataFile(f"{writer.output_file(2022)}.partial"))) == 3
+    assert 'Year 2022 is incomplete with 3 of 12 months' in caplog.text
@@ -0,0 +1,54 @@
+##
+##
+
+import os
+import pytest
+from moviedemo.image_cache import ImageCache
+from benchmarks.fakes import FakeTMDB
+
+
+@pytest.fixture(scope='module')
+def tmdb():
+    with FakeTMDB(latency=0.0) as server:
+        yield server
+
+
+def test_cached_after_first_download(tmp_path, tmdb):
+    cache = ImageCache(str(tmp_path))
+    url = f"{tmdb.image_prefix}/first.jpg"
+    requests_before = tmdb.requests
+    assert cache.get(url) == tmdb.poster
+    assert cache.get(url) == tmdb.poster
+    assert (cache.hits, cache.misses) == (1, 1)
+    assert tmdb.requests - requests_before == 1
+
+
+def test_shared_across_instances(tmp_path, tmdb):
+    url = f"{tmdb.image_prefix}/shared.jpg"
+    ImageCache(str(tmp_path)).get(url)
+    cache = ImageCache(str(tmp_path))
+    requests_before = tmdb.requests
+    assert cache.get(url) == tmdb.poster
+    assert cache.hits == 1
+    assert tmdb.requests == requests_before
+
+
+def test_revalidate_checks_the_server(tmp_path, tmdb):
+    url = f"{tmdb.image_prefix}/revalidate.jpg"
+    ImageCache(str(tmp_path)).get(url)
+    cache = ImageCache(str(tmp_path), revalidate=True)
+    requests_before = tmdb.requests
+    assert cache.get(url) == tmdb.poster
+    assert tmdb.requests - requests_before == 1
+
+
+def test_eviction_keeps_the_cache_under_its_limit(tmp_path, tmdb):
+    cache = ImageCache(str(tmp_path))
+    cache.max_size = len(tmdb.poster) * 3
+    for n in range(6):
+        cache.get(f"{tmdb.image_prefix}/evict-{n}.jpg")
+    data_files = [name for name in os.listdir(str(tmp_path)) if name.endswith('.bin')]
+    assert len(data_files) <= 3
+    assert sum(os.path.getsize(os.path.join(str(tmp_path), name)) for name in data_files) <= cache.max_size
+    assert cache.get(f"{tmdb.image_prefix}/evict-5.jpg") == tmdb.poster
+    assert cache.hits == 1
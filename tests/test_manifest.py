@@ -0,0 +1,30 @@
+##
+##
+
+from moviedemo.manifest import Manifest, fingerprint
+
+MOVIE = dict(id=1, title='Movie', release_date='2023-01-01', popularity=1.5, imdb_id='tt1', overview='Overview',
+             poster_path='/poster.jpg', backdrop_path='/backdrop.jpg')
+
+
+def test_fingerprint_tracks_source_fields():
+    assert fingerprint(MOVIE) == fingerprint(dict(MOVIE, vote_count=10))
+    assert fingerprint(MOVIE) != fingerprint(dict(MOVIE, overview='New overview'))
+    assert fingerprint(MOVIE) != fingerprint(dict(MOVIE, poster_path='/new.jpg'))
+
+
+def test_save_and_reload(tmp_path):
+    file_name = str(tmp_path / 'movies.manifest.json')
+    manifest = Manifest(file_name)
+    assert manifest.get(1) is None
+    manifest.update(1, 'a')
+    manifest.update('2', 'b')
+    manifest.save()
+
+    manifest = Manifest(file_name)
+    assert manifest.get('1') == 'a'
+    assert manifest.ids() == {'1', '2'}
+    manifest.remove(2)
+    manifest.save()
+    assert Manifest(file_name).ids() == {'1'}
+    assert [name for name in tmp_path.iterdir() if name.suffix == '.tmp'] == []
@@ -0,0 +1,83 @@
+##
+##
+
+import json
+import pytest
+from moviedemo.metrics import Histogram, Metrics, metric_key
+
+
+def test_histogram_summary():
+    histogram = Histogram()
+    for n in range(1, 101):
+        histogram.observe(n / 1000.0)
+    summary = histogram.summary()
+    assert summary['count'] == 100
+    assert summary['total_seconds'] == pytest.approx(5.05, abs=0.001)
+    assert summary['max_ms'] == 100.0
+    assert 32.0 <= summary['p50_ms'] <= 64.0
+    assert 64.0 <= summary['p95_ms'] <= 100.0
+    assert Histogram().quantile(0.5) is None
+
+
+def test_counters_timers_and_labels():
+    metrics = Metrics()
+    metrics.increment('http.requests', route='/api/search', status=200)
+    metrics.increment('http.requests', 2, route='/api/search', status=200)
+    with metrics.timer('search.embedding'):
+        pass
+    assert metrics.counters[metric_key('http.requests', dict(route='/api/search', status=200))] == 3
+    assert metrics.histograms['search.embedding'].count == 1
+
+
+def test_disabled_metrics_record_nothing():
+    metrics = Metrics(enabled=False)
+    metrics.increment('retry.attempts')
+    metrics.observe('stage.fetch', 0.1)
+    with metrics.timer('index.create'):
+        pass
+    assert metrics.summary() == dict(timers={}, counters={})
+
+
+def test_save(tmp_path):
+    metrics = Metrics()
+    metrics.increment('image.downloads')
+    metrics.register_gauge('queue.depth', lambda: 4)
+    file_name = str(tmp_path / 'run-metrics.json')
+    metrics.save(file_name, records=10)
+    with open(file_name) as metrics_file:
+        saved = json.load(metrics_file)
+    assert saved['records'] == 10
+    assert saved['counters'] == {'image.downloads': 1}
+    assert saved['gauges'] == {'queue.depth': 4.0}
+
+
+def test_prometheus_format():
+    metrics = Metrics()
+    metrics.increment('http.requests', route='/api/search', status=200)
+    metrics.increment('http.errors', type='Bad "quoted"\nvalue')
+    metrics.add_gauge('http.in_flight', 2)
+    metrics.observe('http.request', 0.003, route='/api/search')
+    metrics.observe('http.request', 5.0, route='/api/search')
+    lines = metrics.prometheus().splitlines()
+
+    assert '# TYPE moviedemo_http_requests_total counter' in lines
+    assert 'moviedemo_http_requests_total{route="/api/search",status="200"} 1' in lines
+    assert 'moviedemo_http_errors_total{type="Bad \\"quoted\\"\\nvalue"} 1' in lines
+    assert '# TYPE moviedemo_http_in_flight gauge' in lines
+    assert 'moviedemo_http_in_flight 2' in lines
+    assert '# TYPE moviedemo_http_request_seconds histogram' in lines
+    assert 'moviedemo_http_request_seconds_bucket{route="/api/search",le="0.004"} 1' in lines
+    assert 'moviedemo_http_request_seconds_bucket{route="/api/search",le="+Inf"} 2' in lines
+    assert 'moviedemo_http_request_seconds_count{route="/api/search"} 2' in lines
+    assert 'moviedemo_http_request_seconds_sum{route="/api/search"} 5.003' in lines
+    assert sum(1 for line in lines if line.startswith('# TYPE moviedemo_http_requests_total')) == 1
+
+
+def test_prometheus_buckets_are_cumulative():
+    metrics = Metrics()
+    for seconds in (0.0005, 0.0015, 0.0015, 0.1):
+        metrics.observe('stage.fetch', seconds)
+    counts = [int(line.rsplit(' ', 1)[1]) for line in metrics.prometheus().splitlines() if line.startswith('moviedemo_stage_fetch_seconds_bucket')]
+    assert counts == sorted(counts)
+    assert counts[0] == 1
+    assert counts[-1] == 4
@@ -0,0 +1,54 @@
+##
+##
+
+import threading
+import pytest
+from moviedemo.pipeline import Pipeline, Stage
+
+
+def test_items_flow_through_every_stage():
+    results = []
+    lock = threading.Lock()
+
+    def collect(item):
+        with lock:
+            results.append(item)
+        return item
+
+    pipeline = Pipeline([Stage('double', lambda n: n * 2, 4), Stage('increment', lambda n: n + 1, 2), Stage('collect', collect, 3)], queue_size=2)
+    pipeline.run(range(100))
+    assert sorted(results) == [n * 2 + 1 for n in range(100)]
+    assert pipeline.completed == 100
+    assert pipeline.errors == 0
+
+
+def test_filtered_items_complete_early():
+    written = []
+    pipeline = Pipeline([Stage('filter', lambda n: n if n % 2 else None, 2), Stage('write', written.append, 1)])
+    pipeline.run(range(10))
+    assert sorted(written) == [1, 3, 5, 7, 9]
+    assert pipeline.completed == 10
+
+
+def test_errors_are_reported_and_counted():
+    failures = []
+    progress = []
+
+    def check(n):
+        if n == 3:
+            raise ValueError('bad item')
+        return n
+
+    pipeline = Pipeline([Stage('check', check, 2), Stage('write', lambda n: n, 1)],
+                        on_progress=lambda p: progress.append(p.completed),
+                        on_error=lambda stage, item, err: failures.append((stage, item, str(err))))
+    pipeline.run(range(5))
+    assert failures == [('check', 3, 'bad item')]
+    assert pipeline.errors == 1
+    assert pipeline.completed == 5
+    assert sorted(progress) == [1, 2, 3, 4, 5]
+
+
+def test_stage_needs_a_worker():
+    with pytest.raises(ValueError):
+        Stage('empty', lambda n: n, 0)
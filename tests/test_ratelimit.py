@@ -0,0 +1,48 @@
+##
+##
+
+import time
+import asyncio
+import pytest
+from moviedemo.ratelimit import RateLimiter
+
+
+def test_burst_then_wait():
+    limiter = RateLimiter(6000, burst=3)
+    start = time.monotonic()
+    for _ in range(3):
+        limiter.acquire()
+    assert limiter.wait_time == 0.0
+    limiter.acquire()
+    limiter.acquire()
+    assert limiter.wait_time > 0.0
+    assert time.monotonic() - start >= 0.015
+
+
+def test_async_acquire_waits():
+    limiter = RateLimiter(6000, burst=1)
+
+    async def run():
+        for _ in range(3):
+            await limiter.acquire_async()
+
+    asyncio.run(run())
+    assert limiter.wait_time > 0.0
+
+
+def test_throttle_backoff_and_recovery():
+    limiter = RateLimiter(600, min_requests_per_minute=60, increase=0.5)
+    limiter.throttled()
+    assert limiter.throttle_count == 1
+    assert limiter.requests_per_minute == pytest.approx(300)
+    for _ in range(5):
+        limiter.throttled()
+    assert limiter.requests_per_minute == pytest.approx(60)
+    for _ in range(10):
+        limiter.success()
+    assert limiter.requests_per_minute == pytest.approx(600)
+
+
+def test_invalid_rate():
+    with pytest.raises(ValueError):
+        RateLimiter(0)
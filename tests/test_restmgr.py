@@ -0,0 +1,38 @@
+##
+##
+
+import pytest
+from aiohttp import web
+from moviedemo.restmgr import RESTManager, ClientError
+from benchmarks.fakes import FakeTMDB
+
+
+class UnauthorizedTMDB(FakeTMDB):
+
+    async def discover(self, request: web.Request) -> web.Response:
+        self.requests += 1
+        return web.json_response(dict(status_code=7, status_message="Invalid API key"), status=401)
+
+
+def rest_manager(tmdb: FakeTMDB) -> RESTManager:
+    return RESTManager(hostname='127.0.0.1', port=tmdb.port, use_ssl=False, requests_per_second=None, image_prefix=tmdb.image_prefix)
+
+
+def test_years_deliver_every_month():
+    months = {}
+    with FakeTMDB(movies_per_month=25, latency=0.0) as tmdb:
+        rest = rest_manager(tmdb)
+        rest.get_tmdb_years([2022], lambda year, month, movies: months.update({(year, month): movies}), months=2)
+        rest.close()
+    assert sorted(months) == [(2022, month) for month in range(1, 13)]
+    assert all(len(movies) == 25 for movies in months.values())
+    assert months[(2022, 1)][0]['poster_path'].startswith(tmdb.image_prefix)
+
+
+def test_client_error_fails_the_run():
+    with UnauthorizedTMDB(latency=0.0) as tmdb:
+        rest = rest_manager(tmdb)
+        with pytest.raises(ClientError, match='401'):
+            rest.get_tmdb_years([2022], lambda year, month, movies: None)
+        rest.close()
+        assert tmdb.requests < 12
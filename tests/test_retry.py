@@ -0,0 +1,61 @@
+##
+##
+
+import asyncio
+import pytest
+from moviedemo.retry import retry, RetryAfter, RetryBudget, parse_retry_after
+
+
+def flaky(errors):
+    calls = []
+
+    async def call():
+        calls.append(1)
+        if len(calls) <= len(errors):
+            raise errors[len(calls) - 1]
+        return len(calls)
+
+    return call, calls
+
+
+def test_budget_withdraw_and_deposit():
+    budget = RetryBudget(ratio=0.5, min_retries=2, max_tokens=3)
+    assert budget.withdraw()
+    assert budget.withdraw()
+    assert not budget.withdraw()
+    budget.deposit()
+    budget.deposit()
+    assert budget.withdraw()
+    for _ in range(20):
+        budget.deposit()
+    assert budget.tokens == 3
+
+
+def test_empty_budget_stops_retries():
+    budget = RetryBudget(min_retries=0)
+    call, calls = flaky([ValueError('failed')] * 3)
+    with pytest.raises(ValueError):
+        asyncio.run(retry(factor=0.001, budget=budget)(call)())
+    assert len(calls) == 1
+
+
+def test_retry_after_does_not_use_budget():
+    budget = RetryBudget(min_retries=0)
+    call, calls = flaky([RetryAfter('throttled', 0.0)] * 5)
+    assert asyncio.run(retry(factor=0.001, budget=budget)(call)()) == 6
+    assert budget.tokens == pytest.approx(budget.ratio)
+
+
+def test_retry_count_limit():
+    call, calls = flaky([RetryAfter('throttled', 0.0)] * 5)
+    with pytest.raises(RetryAfter):
+        asyncio.run(retry(retry_count=2, factor=0.001)(call)())
+    assert len(calls) == 3
+
+
+def test_parse_retry_after():
+    assert parse_retry_after('3') == 3.0
+    assert parse_retry_after('-1') == 0.0
+    assert parse_retry_after('Wed, 21 Oct 2015 07:28:00 GMT') == 0.0
+    assert parse_retry_after('soon') is None
+    assert parse_retry_after(None) is None
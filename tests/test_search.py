@@ -0,0 +1,92 @@
+##
+##
+
+import numpy as np
+import pytest
+from moviedemo.datafile import DataWriter
+from couchbase.exceptions import DocumentNotFoundException, CollectionNotFoundException
+from moviedemo.search import SearchBackend, LocalSearch, CouchbaseSearch, bump_generation
+
+
+@pytest.fixture
+def movie_file(tmp_path):
+    rng = np.random.default_rng(0)
+    file_name = str(tmp_path / 'movies.jsonl')
+    with DataWriter(file_name, 'jsonl') as writer:
+        writer.write([dict(id=str(n), title=f"Movie {n}", image_embedding=rng.standard_normal(16).tolist(), text_embedding=rng.standard_normal(16).tolist())
+                      for n in range(50)])
+    return file_name
+
+
+def test_backend_is_abstract():
+    with pytest.raises(TypeError):
+        SearchBackend()
+
+
+def test_exact_search(movie_file):
+    backend = LocalSearch.from_file(movie_file)
+    query = backend.vectors['image_embedding'][7]
+    results = backend.search(query.tolist(), 'image_embedding', 3, ['id', 'title'])
+    assert results[0] == dict(id='7', title='Movie 7')
+    assert len(results) == 3
+    assert 'image_embedding' not in backend.documents[0]
+
+
+def test_unloaded_field(movie_file):
+    backend = LocalSearch.from_file(movie_file, vector_fields=('image_embedding',))
+    assert 'text_embedding' not in backend.documents[0]
+    assert backend.has_field('image_embedding')
+    assert not backend.has_field('text_embedding')
+    with pytest.raises(ValueError):
+        backend.search([0.0] * 16, 'text_embedding')
+
+
+def test_load_index_checks_field(movie_file, tmp_path):
+    backend = LocalSearch.from_file(movie_file)
+    index = backend.build_index('text_embedding', nlist=4)
+    index.save(str(tmp_path / 'index'), field='text_embedding', source=movie_file)
+    with pytest.raises(ValueError, match='text_embedding'):
+        backend.load_index(str(tmp_path / 'index'), 'image_embedding', movie_file)
+    assert backend.load_index(str(tmp_path / 'index'), 'text_embedding', movie_file).nlist == 4
+
+
+def test_load_index_warns_on_other_source(movie_file, tmp_path, caplog):
+    backend = LocalSearch.from_file(movie_file)
+    backend.build_index('image_embedding', nlist=4).save(str(tmp_path / 'index'), field='image_embedding', source=str(tmp_path / 'other.jsonl'))
+    backend.load_index(str(tmp_path / 'index'), 'image_embedding', movie_file)
+    assert 'other.jsonl' in caplog.text
+
+
+class MetaOperation(object):
+    bucket = 'bucket'
+    scope = 'scope'
+    collection = 'movies'
+    get_keyspace = 'bucket.scope.movies'
+
+    def __init__(self):
+        self.collections = {'movies': {}}
+
+    def get_collection(self, bucket, scope, name):
+        if name not in self.collections:
+            raise CollectionNotFoundException(f"collection {name} does not exist")
+        return name
+
+    def create_collection(self, bucket, scope, name):
+        self.collections.setdefault(name, {})
+
+    def put_doc(self, collection, key, document):
+        self.collections[collection][key] = document
+
+    def get_doc(self, collection, key):
+        if key not in self.collections[collection]:
+            raise DocumentNotFoundException(message=f"document {key} not found")
+        return self.collections[collection][key]
+
+
+def test_generation_is_kept_out_of_the_data_collection():
+    op = MetaOperation()
+    backend = CouchbaseSearch(op)
+    assert backend.generation() == 0
+    generation = bump_generation(op)
+    assert op.collections['movies'] == {}
+    assert backend.generation() == generation
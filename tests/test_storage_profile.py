@@ -0,0 +1,66 @@
+##
+##
+
+import numpy as np
+import pytest
+from moviedemo.storage_profile import encode_vector, decode_vector, decode_document, StorageProfile, ENCODINGS
+from moviedemo.manifest import fingerprint
+
+
+@pytest.fixture
+def vector():
+    return np.random.default_rng(0).standard_normal(128).astype(np.float32).tolist()
+
+
+@pytest.mark.parametrize('encoding,tolerance', [('float32', 0.0), ('base64', 0.0), ('float16', 1e-2), ('int8', 5e-2)])
+def test_round_trip(vector, encoding, tolerance):
+    decoded = decode_vector(encode_vector(vector, encoding), encoding)
+    assert len(decoded) == len(vector)
+    assert np.allclose(decoded, vector, atol=tolerance)
+
+
+def test_base64_is_little_endian_float32(vector):
+    encoded = encode_vector(vector, 'base64')
+    assert isinstance(encoded, str)
+    assert np.array_equal(decode_vector(encoded), np.asarray(vector, dtype='<f4'))
+
+
+def test_int8_zero_vector():
+    encoded = encode_vector([0.0] * 8, 'int8')
+    assert encoded['scale'] == 1.0
+    assert decode_vector(encoded, 'int8') == [0.0] * 8
+
+
+def test_none_and_unknown_encoding():
+    for encoding in ENCODINGS:
+        assert encode_vector(None, encoding) is None
+    assert decode_vector(None) is None
+    with pytest.raises(ValueError):
+        encode_vector([1.0], 'bfloat16')
+
+
+def test_decode_document(vector):
+    profile = StorageProfile(128, 'float16')
+    document = dict(title='Movie', embedding_encoding='float16', image_embedding=profile.encode(vector), text_embedding=None)
+    decoded = decode_document(document)
+    assert np.allclose(decoded['image_embedding'], vector, atol=1e-2)
+    assert decoded['text_embedding'] is None
+    assert decoded['title'] == 'Movie'
+
+
+def test_profile_validation():
+    assert StorageProfile(256, 'base64').indexable
+    assert not StorageProfile(256, 'int8').indexable
+    with pytest.raises(ValueError):
+        StorageProfile(300)
+    with pytest.raises(ValueError):
+        StorageProfile(128, 'float64')
+
+
+def test_fingerprint_includes_profile_settings():
+    movie = dict(title='Movie', overview='Overview', poster_path='/poster.jpg')
+    full = fingerprint(movie, model='multimodalembedding', **StorageProfile(1408, 'float32').settings)
+    assert full == fingerprint(dict(movie), model='multimodalembedding', **StorageProfile(1408, 'float32').settings)
+    assert full != fingerprint(movie, model='multimodalembedding', **StorageProfile(256, 'float32').settings)
+    assert full != fingerprint(movie, model='multimodalembedding', **StorageProfile(1408, 'base64').settings)
+    assert full != fingerprint(movie, model='other', **StorageProfile(1408, 'float32').settings)